@@ -1,162 +1,231 @@
-import gurobipy as gp
-from gurobipy import GRB
-import itertools
 import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import Bounds, LinearConstraint, milp
 
+try:
+    import gurobipy as gp
+    from gurobipy import GRB
+except ImportError:  # gurobi is optional, the open source HiGHS backend is used instead
+    gp = None
 
-def get_data_adwords(u_size, v_size, adjacency_matrix):
-    """
-    pre-process the data for groubi for the adwords problem
-    Reads data from the specfied file and writes the graph tensor into multu dict of the following form:
-        combinations, ms= gp.multidict({
-            ('u1','v1'):10,
-            ('u1','v2'):13,
-            ('u2','v1'):9,
-            ('u2','v2'):3
-        })
-    """
-
-    adj_dic = {}
-
-    for v, u in itertools.product(range(v_size), range(u_size)):
-        adj_dic[(v, u)] = adjacency_matrix[u, v]
+# 15 is the fixed number of genres from the movielens dataset
+NUM_GENRES = 15
 
-    return gp.multidict(adj_dic)
 
-
-def get_data_osbm(u_size, v_size, adjacency_matrix, prefrences):
+def solve_milp_gurobi(c, A, b, time_limit=None, start=None):
+    """
+    Maximizes c @ x subject to A @ x <= b over binary x with gurobi, returns the objective and x
+    (None if no solution was found). start is used as the MIP start.
     """
-    pre-process the data for groubi for the osbm problem
+    m = gp.Model()
+    m.Params.LogToConsole = 0
+    if time_limit is not None:
+        m.Params.timeLimit = time_limit
+    x = m.addMVar(len(c), vtype=GRB.BINARY)
+    m.addMConstr(A, x, "<", b)
+    m.setObjective(c @ x, GRB.MAXIMIZE)
+    if start is not None:
+        x.Start = start
+    m.optimize()
+    if m.SolCount == 0:
+        return None, None
+    return m.objVal, x.X
+
+
+def solve_milp_highs(c, A, b, time_limit=None, start=None):
     """
+    Maximizes c @ x subject to A @ x <= b over binary x with HiGHS (through scipy), returns the objective and x
+    (None if no solution was found). scipy's milp does not take a MIP start, so start is not used here.
+    """
+    options = {} if time_limit is None else {"time_limit": time_limit}
+    res = milp(
+        -c,
+        constraints=LinearConstraint(A, -np.inf, b),
+        integrality=np.ones(len(c)),
+        bounds=Bounds(0, 1),
+        options=options,
+    )
+    if res.x is None:
+        return None, None
+    return -res.fun, res.x
 
-    adj_dic = {}
-    w = {}
 
-    for v, u in itertools.product(range(v_size), range(u_size)):
-        adj_dic[(v, u)] = adjacency_matrix[v][u]
-    _, dic = gp.multidict(adj_dic)
+BACKENDS = {"gurobi": solve_milp_gurobi, "highs": solve_milp_highs}
 
-    for i, j in itertools.product(
-        range(prefrences.shape[0]), range(prefrences.shape[1])
-    ):
-        w[(j, i)] = prefrences[i][j]
-    return dic, w
 
+def solve_milp(c, A, b, backend=None, time_limit=None, start=None):
+    """
+    Solves the binary program max c @ x s.t. A @ x <= b with the given backend, 'gurobi' or 'highs'.
+    Defaults to gurobi when gurobipy is installed and to HiGHS otherwise.
+    start is a feasible solution (e.g. from a heuristic) used to warm start the solver, it is returned
+    instead of the solver's solution when the time limit stops the solver before it does better.
+    """
+    if backend is None:
+        backend = "gurobi" if gp is not None else "highs"
+    assert backend in BACKENDS, "Unknown solver backend: {}".format(backend)
+    assert backend != "gurobi" or gp is not None, "gurobipy is not installed"
+    objVal, x = BACKENDS[backend](c, A, b, time_limit, start)
+    if start is not None and (x is None or objVal < c @ start):
+        objVal, x = c @ start, start
+    assert x is not None, "The {} solver found no solution".format(backend)
+    return objVal, x
+
+
+def msvv_solution(adjacency_matrix, budgets):
+    """
+    Runs MSVV (see policy/msvv.py) on the |U| by |V| adjacency matrix: every arrival is matched to the
+    neighbor u with enough budget left maximizing w * (1 - exp(-remaining budget / budget)).
+    Returns the matched u + 1 of every arrival, 0 if skipped.
+    """
+    adjacency_matrix = np.asarray(adjacency_matrix, dtype=float)
+    budgets = np.asarray(budgets, dtype=float)
+    curr_budget = budgets.copy()
+    solution = np.zeros(adjacency_matrix.shape[1], dtype=int)
+    for v in range(adjacency_matrix.shape[1]):
+        w = adjacency_matrix[:, v]
+        feasible = (w > 0) & (w <= curr_budget)
+        if not feasible.any():
+            continue
+        frac_budget = np.divide(
+            curr_budget, budgets, out=np.zeros_like(budgets), where=budgets > 0
+        )
+        scaled_w = np.where(feasible, w * (1 - np.exp(-frac_budget)), -np.inf)
+        u = np.argmax(scaled_w)
+        solution[v] = u + 1
+        curr_budget[u] -= w[u]
+    return solution
 
-def solve_adwords(u_size, v_size, adjacency_matrix, budgets):
-    try:
-        m = gp.Model("adwords")
-        # m.Params.LogToConsole = 0
-        m.Params.timeLimit = 30
 
-        _, dic = get_data_adwords(u_size, v_size, adjacency_matrix)
+def greedy_osbm_solution(adjacency_matrix, r_v, movie_features, preferences):
+    """
+    Greedy osbm solution: every user in turn takes up to len(r_v[v]) of its unmatched neighbor movies,
+    each time the one that covers the most preference weight of genres it does not cover yet.
+    Returns the |V| by |U| 0/1 matrix of the matched edges.
+    """
+    adjacency_matrix = np.asarray(adjacency_matrix)
+    movie_features = np.asarray(movie_features, dtype=float)
+    preferences = np.asarray(preferences, dtype=float)
+    matched = np.zeros(adjacency_matrix.shape, dtype=bool)
+    taken = np.zeros(adjacency_matrix.shape[1], dtype=bool)
+    for v, n in enumerate(r_v):
+        covered = np.zeros(movie_features.shape[1])
+        for _ in range(len(r_v[n])):
+            gain = (np.maximum(movie_features - covered, 0) * preferences[v]).sum(1)
+            gain[(adjacency_matrix[v] == 0) | taken] = 0
+            u = np.argmax(gain)
+            if gain[u] <= 0:
+                break
+            matched[v, u] = taken[u] = True
+            covered = np.maximum(covered, movie_features[u])
+    return matched
+
+
+def adwords_milp(u_size, v_size, adjacency_matrix, budgets):
+    """
+    Sparse adwords formulation with one binary variable per edge (u, v) of the |U| by |V| adjacency matrix:
+    every node in V is matched at most once and the weight matched to u is at most its budget.
+    Returns c, A, b and the (u, v) endpoints of the variables.
+    """
+    adjacency_matrix = np.asarray(adjacency_matrix, dtype=float)
+    us, vs = np.nonzero(adjacency_matrix)
+    w = adjacency_matrix[us, vs]
+    edges = np.arange(len(w))
+    A = sp.vstack(
+        (
+            sp.csr_matrix((np.ones(len(w)), (vs, edges)), shape=(v_size, len(w))),
+            sp.csr_matrix((w, (us, edges)), shape=(u_size, len(w))),
+        )
+    ).tocsr()
+    b = np.concatenate((np.ones(v_size), np.asarray(budgets, dtype=float)))
+    return w, A, b, us, vs
 
-        # add variable
-        x = m.addVars(v_size, u_size, vtype="B", name="(u,v) pairs")
 
-        # set constraints
-        m.addConstrs((x.sum(v, "*") <= 1 for v in range(v_size)), "V")
-        m.addConstrs((x.prod(dic, "*", u) <= budgets[u] for u in range(u_size)), "U")
+def osbm_milp(u_size, v_size, adjacency_matrix, r_v, movie_features, preferences):
+    """
+    Sparse osbm formulation. x has one binary variable per edge (v, u) of the |V| by |U| adjacency matrix,
+    gamma[z, v] is 1 if user v is matched to at least one movie of genre z and is weighted by the user's
+    preference for z. v is matched at most len(r_v[v]) times and every movie u at most once.
+    Returns c, A, b and the (v, u) endpoints of the x variables.
+    """
+    adjacency_matrix = np.asarray(adjacency_matrix)
+    movie_features = np.asarray(movie_features)
+    vs, us = np.nonzero(adjacency_matrix)
+    num_x, num_gamma = len(vs), NUM_GENRES * v_size
+    edges = np.arange(num_x)
+    # gamma[z, v] - sum_u movie_features[u, z] * x[v, u] <= 0
+    e, z = np.nonzero(movie_features[us] == 1.0)
+    gamma = np.arange(num_gamma)
+    coverage = sp.csr_matrix(
+        (
+            np.concatenate((-np.ones(len(e)), np.ones(num_gamma))),
+            (
+                np.concatenate((z * v_size + vs[e], gamma)),
+                np.concatenate((e, num_x + gamma)),
+            ),
+        ),
+        shape=(num_gamma, num_x + num_gamma),
+    )
+    A = sp.vstack(
+        (
+            sp.csr_matrix(
+                (np.ones(num_x), (vs, edges)), shape=(v_size, num_x + num_gamma)
+            ),
+            sp.csr_matrix(
+                (np.ones(num_x), (us, edges)), shape=(u_size, num_x + num_gamma)
+            ),
+            coverage,
+        )
+    ).tocsr()
+    b = np.concatenate(
+        (
+            [len(r_v[n]) for n in r_v],
+            np.ones(u_size),
+            np.zeros(num_gamma),
+        )
+    )
+    c = np.concatenate(
+        (np.zeros(num_x), np.asarray(preferences, dtype=float).T.flatten())
+    )
+    return c, A, b, vs, us
 
-        # set the objective
-        m.setObjective(x.prod(dic), GRB.MAXIMIZE)
-        m.optimize()
 
-        solution = np.zeros(v_size).tolist()
-        for v in range(v_size):
-            u = 0
-            for nghbr_v in x.select(v, "*"):
-                if nghbr_v.getAttr("x") == 1:
-                    solution[v] = u + 1
-                    break
-                u += 1
-        return m.objVal, solution
+def solve_adwords(u_size, v_size, adjacency_matrix, budgets, backend=None):
+    c, A, b, us, vs = adwords_milp(u_size, v_size, adjacency_matrix, budgets)
+    start = (msvv_solution(adjacency_matrix, budgets)[vs] == us + 1).astype(float)
+    objVal, x = solve_milp(c, A, b, backend=backend, time_limit=30, start=start)
 
-    except gp.GurobiError as e:
-        print("Error code " + str(e.errno) + ": " + str(e))
-    except AttributeError:
-        print("Encountered an attribute error")
+    solution = np.zeros(v_size)
+    matched = x > 0.5
+    solution[vs[matched]] = us[matched] + 1
+    return objVal, solution.tolist()
 
 
 def solve_submodular_matching(
-    u_size, v_size, adjacency_matrix, r_v, movie_features, preferences, num_incoming
+    u_size,
+    v_size,
+    adjacency_matrix,
+    r_v,
+    movie_features,
+    preferences,
+    num_incoming,
+    backend=None,
 ):
-    try:
-        m = gp.Model("submatching")
-        m.Params.LogToConsole = 0
-        # 15 is the fixed number of genres from the movielens dataset
-        genres = 15
-        dic, weight_dic = get_data_osbm(u_size, v_size, adjacency_matrix, preferences)
-
-        # add variable for each edge (u,v), where v is the user and u is the movie
-        x = m.addVars(v_size, u_size, vtype="B", name="(u,v) pairs")
-
-        # set the variable to zero for edges that do not exist in the graph
-        for key in x:
-            x[key] = 0 if dic[key] == 0 else x[key]
-
-        # create variable for each (genre, user) pair
-        gamma = m.addVars(genres, v_size, vtype="B", name="gamma")
-
-        # A is |genres| by |V| matrix containg the total number of edges going from u to genere g at index (g,u)
-        A = m.addVars(genres, v_size)
-
-        # first set all variables in A to zero
-        for key in A:
-            A[key] = 0
-
-        for z, v in itertools.product(range(genres), range(v_size)):
-            for u in range(u_size):
-                if movie_features[u][z] == 1.0:  # if u belongs to genre z
-                    A[(z, v)] += x[(v, u)]
-
-        # set constraints
-        r_v1 = {}
-        for i, n in enumerate(r_v):
-            r_v1[i] = r_v[n]
-        m.addConstrs((x.sum(v, "*") <= len(r_v1[v]) for v in r_v1), "const1")
-        m.addConstrs((x.sum("*", u) <= 1 for u in range(u_size)), "const2")
-        m.addConstrs(
-            (
-                gamma[(z, v)] <= A[(z, v)]
-                for z, v in itertools.product(range(genres), range(v_size))
-            ),
-            "const3",
-        )
-        m.addConstrs(
-            (
-                gamma[(z, v)] <= 1
-                for z, v in itertools.product(range(genres), range(v_size))
-            ),
-            "const4",
-        )
-
-        # give each gamma variable a weight based on the user preferences and optimiza the sum
-        m.setObjective(gamma.prod(weight_dic), GRB.MAXIMIZE)
-        m.optimize()
-        solution = np.zeros(num_incoming).tolist()
-        sol_dict = dict(x)
-        s = sorted(sol_dict.keys(), key=(lambda k: k[0]))
-        matched = 0
-        for i, p in enumerate(r_v1):
-            matched = 0
-            inds = r_v1[p]
-            idx = i * u_size
-            nodes = s[idx : idx + u_size]
-            for j, u in enumerate(nodes):
-                if (type(x[u]) is not int) and x[u].x == 1:
-                    solution[inds[matched]] = u[1] + 1
-                    matched += 1
-
-            for j in range(len(inds) - matched):
-                solution[inds[j + matched]] = 0
-
-        return m.objVal, solution
-
-    except gp.GurobiError as e:
-        print("Error code " + str(e.errno) + ": " + str(e))
-    except AttributeError:
-        print("Encountered an attribute error")
+    c, A, b, vs, us = osbm_milp(
+        u_size, v_size, adjacency_matrix, r_v, movie_features, preferences
+    )
+    matched = greedy_osbm_solution(adjacency_matrix, r_v, movie_features, preferences)
+    # gamma[z, v] of the greedy solution: v covers genre z
+    gamma = (matched.astype(float) @ np.asarray(movie_features)).T > 0
+    start = np.concatenate((matched[vs, us], gamma.flatten())).astype(float)
+    objVal, x = solve_milp(c, A, b, backend=backend, start=start)
+
+    # every arrival of the same user takes one of its matched movies, in increasing order
+    solution = np.zeros(num_incoming)
+    matched = x[: len(vs)] > 0.5
+    for i, n in enumerate(r_v):
+        movies = us[matched & (vs == i)] + 1
+        solution[r_v[n][: len(movies)]] = movies
+    return objVal, solution.tolist()
 
 
 if __name__ == "__main__":
@@ -189,8 +258,10 @@ if __name__ == "__main__":
 
     # adwords exmaple:
 
-    # V by U matrix
+    # U by V matrix
     adjacency_matrix = np.array([[1, 2, 0], [0, 1, 0], [4, 0, 0]])
 
     budgets = [3, 1, 4]
-    print(solve_adwords(3, 3, adjacency_matrix, budgets))
+    for backend in BACKENDS:
+        if backend != "gurobi" or gp is not None:
+            print(backend, solve_adwords(3, 3, adjacency_matrix, budgets, backend))
@@ -0,0 +1,146 @@
+import numpy as np
+import scipy.sparse as sp
+import torch
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+
+def _batched_assignment(cost):
+    """
+    Shortest augmenting path (Jonker-Volgenant, as in scipy's linear_sum_assignment) run on a whole batch
+    of B by n by m cost matrices with n <= m at once: row r of every instance is augmented in the same
+    iteration, and the Dijkstra search of each instance is masked out once it reached a free column.
+    Returns the B by n column assigned to every row, minimizing the total cost.
+    """
+    B, n, m = cost.shape
+    batch = torch.arange(B, device=cost.device)
+    u = cost.new_zeros(B, n)
+    v = cost.new_zeros(B, m)
+    col4row = torch.full((B, n), -1, dtype=torch.long, device=cost.device)
+    row4col = torch.full((B, m), -1, dtype=torch.long, device=cost.device)
+    for cur_row in range(n):
+        spc = torch.full_like(v, float("inf"))  # shortest path costs to the columns
+        path = torch.full_like(row4col, -1)
+        visited_rows = torch.zeros_like(u, dtype=torch.bool)
+        visited_cols = torch.zeros_like(v, dtype=torch.bool)
+        min_val = cost.new_zeros(B)
+        i = torch.full((B,), cur_row, dtype=torch.long, device=cost.device)
+        sink = torch.full((B,), -1, dtype=torch.long, device=cost.device)
+        active = torch.ones(B, dtype=torch.bool, device=cost.device)
+        while active.any():
+            b, i_b = batch[active], i[active]
+            visited_rows[b, i_b] = True
+            reduced = (
+                min_val[b, None] + cost[b, i_b] - u[b, i_b, None] - v[b]
+            ).masked_fill(visited_cols[b], float("inf"))
+            shorter = reduced < spc[b]
+            path[b] = torch.where(shorter, i_b[:, None], path[b])
+            spc[b] = torch.where(shorter, reduced, spc[b])
+            # closest unvisited column, preferring a free one among ties
+            remaining = spc[b].masked_fill(visited_cols[b], float("inf"))
+            closest = remaining.min(1).values
+            assert torch.isfinite(closest).all(), "The assignment is infeasible"
+            ties = remaining == closest[:, None]
+            free_ties = ties & (row4col[b] == -1)
+            j = torch.where(
+                free_ties.any(1), free_ties.float().argmax(1), ties.float().argmax(1)
+            )
+            min_val[b] = closest
+            visited_cols[b, j] = True
+            free = row4col[b, j] == -1
+            sink[b[free]] = j[free]
+            i[b[~free]] = row4col[b[~free], j[~free]]
+            active[b[free]] = False
+
+        # update the dual variables
+        u[:, cur_row] += min_val
+        others = visited_rows.clone()
+        others[:, cur_row] = False
+        b, rows = others.nonzero(as_tuple=True)
+        u[b, rows] += min_val[b] - spc[b, col4row[b, rows]]
+        v -= torch.where(visited_cols, min_val[:, None] - spc, v.new_zeros(()))
+
+        # augment the matching along the path back from the sink
+        j = sink
+        active = torch.ones(B, dtype=torch.bool, device=cost.device)
+        while active.any():
+            b, j_b = batch[active], j[active]
+            i_b = path[b, j_b]
+            row4col[b, j_b] = i_b
+            j[b] = col4row[b, i_b]
+            col4row[b, i_b] = j_b
+            active[b[i_b == cur_row]] = False
+    return col4row
+
+
+def batched_matching(weights, method=None):
+    """
+    Maximum weight matchings of a batch of B by |V| by |U| weight tensors (0 where there is no edge;
+    smaller graphs can be zero-padded). Returns the B optimal values and the B by |V| assignment vectors:
+    the matched u + 1 of every arrival, 0 if it is not matched (or only through a 0 weight edge).
+    method 'torch' runs the exact assignment of the whole batch on the tensors' device, 'scipy' runs
+    linear_sum_assignment instance by instance, which is faster on the cpu, and 'sparse' runs
+    sparse_matching instance by instance, for large sparse graphs. Defaults to 'torch' on the gpu and
+    to 'scipy' otherwise.
+    """
+    weights = torch.as_tensor(weights)
+    if weights.dim() == 2:
+        values, assignment = batched_matching(weights[None], method)
+        return values[0], assignment[0]
+    if method is None:
+        method = "torch" if weights.is_cuda else "scipy"
+    assert method in ("torch", "scipy", "sparse"), "Unknown matching method: {}".format(
+        method
+    )
+    B, v_size, u_size = weights.shape
+    device = weights.device
+    if method == "sparse":
+        values, assignments = zip(*[sparse_matching(w) for w in weights.cpu().numpy()])
+        return (
+            torch.tensor(values, dtype=weights.dtype, device=device),
+            torch.from_numpy(np.stack(assignments)).to(device),
+        )
+    # the search runs over the smaller side
+    transpose = v_size > u_size
+    cost = -weights.double()
+    cost = cost.transpose(1, 2) if transpose else cost
+    if method == "torch":
+        col4row = _batched_assignment(cost)
+    else:
+        col4row = torch.stack(
+            [torch.from_numpy(linear_sum_assignment(c)[1]) for c in cost.cpu().numpy()]
+        ).to(device)
+    if transpose:
+        match_u = torch.full((B, v_size), -1, dtype=torch.long, device=device)
+        match_u.scatter_(1, col4row, torch.arange(u_size, device=device).expand(B, -1))
+    else:
+        match_u = col4row
+    matched = match_u >= 0
+    w = weights.gather(2, match_u.clamp(min=0)[..., None])[..., 0]
+    w = torch.where(matched, w, torch.zeros_like(w))
+    assignment = torch.where(w != 0, match_u + 1, torch.zeros_like(match_u))
+    return w.sum(1), assignment
+
+
+def sparse_matching(weights):
+    """
+    Maximum weight matching of one large sparse |V| by |U| weight matrix (scipy sparse or dense array)
+    with scipy's LAPJVsp. A 0 weight dummy edge per arrival makes a full matching of V always exist, and
+    every weight is shifted by 1 so that the dummy edges are not dropped as zeros; as every full matching
+    has |V| edges the shift does not change the optimum.
+    Returns the optimal value and the assignment vector, as batched_matching.
+    """
+    weights = sp.csr_matrix(weights, dtype=float)
+    weights.eliminate_zeros()
+    v_size, u_size = weights.shape
+    shifted = sp.hstack((weights, sp.csr_matrix((v_size, v_size)))).tocsr()
+    shifted.data += 1
+    shifted = shifted + sp.csr_matrix(
+        (np.ones(v_size), (np.arange(v_size), u_size + np.arange(v_size))),
+        shape=shifted.shape,
+    )
+    rows, cols = min_weight_full_bipartite_matching(shifted, maximize=True)
+    assignment = np.zeros(v_size, dtype=np.int64)
+    real = cols < u_size
+    assignment[rows[real]] = cols[real] + 1
+    return weights[rows[real], cols[real]].sum(), assignment
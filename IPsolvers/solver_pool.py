@@ -0,0 +1,130 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+
+try:
+    import gurobipy as gp
+except ImportError:
+    gp = None
+
+
+def content_hash(fn, args):
+    """
+    Hash of a solve: the name of the solver function and the content of its arguments (arrays, scalars and
+    dicts of them, e.g. r_v). The backend is not part of it, the result of either backend is a valid label.
+    """
+    h = hashlib.sha1(fn.__name__.encode())
+
+    def update(a):
+        if isinstance(a, dict):
+            h.update(b"dict")
+            for k, v in a.items():
+                update(k)
+                update(v)
+        else:
+            a = np.ascontiguousarray(a)
+            h.update(str((a.dtype.str, a.shape)).encode())
+            h.update(a.tobytes())
+
+    for a in args:
+        update(a)
+    return h.hexdigest()
+
+
+class SolutionCache(object):
+    """
+    Solver results keyed by content_hash, stored in one sqlite file so that concurrent generation jobs can
+    share it without writing a file per instance.
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=60)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, value BLOB)"
+            )
+        return self.conn
+
+    def get(self, key):
+        row = (
+            self._connect()
+            .execute("SELECT value FROM solutions WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO solutions VALUES (?, ?)",
+                (key, pickle.dumps(value)),
+            )
+
+
+def _init_solver_worker():
+    # several solves share the machine, so each one runs on a single thread
+    if gp is not None:
+        gp.setParam("Threads", 1)
+
+
+class SolverPool(object):
+    """
+    Runs solves on num_workers single-threaded processes (inline if num_workers <= 1) and caches their
+    results in a SolutionCache, so an instance that was already solved is never solved again.
+    """
+
+    def __init__(self, num_workers=1, cache=None):
+        self.num_workers = num_workers
+        self.cache = SolutionCache(cache) if cache else None
+        self.pool = None
+        if num_workers > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=num_workers, initializer=_init_solver_worker
+            )
+
+    def _submit(self, fn, args, kwargs):
+        key = content_hash(fn, args) if self.cache is not None else None
+        result = self.cache.get(key) if key is not None else None
+        future = Future()
+        if result is not None:
+            future.set_result(result)
+            key = None  # already cached
+        elif self.pool is not None:
+            future = self.pool.submit(fn, *args, **kwargs)
+        else:
+            future.set_result(fn(*args, **kwargs))
+        return key, future
+
+    def imap(self, tasks, **kwargs):
+        """
+        tasks yields (tag, fn, args). Yields (tag, fn(*args, **kwargs)) in order, while keeping up to
+        2 * num_workers solves in flight so that the pool stays busy while the next tasks are generated.
+        """
+        pending = deque()
+        max_pending = 2 * self.num_workers if self.pool is not None else 1
+        for tag, fn, args in tasks:
+            pending.append((tag,) + self._submit(fn, args, kwargs))
+            while len(pending) >= max_pending:
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    def _collect(self, tag, key, future):
+        result = future.result()
+        if key is not None:
+            self.cache.put(key, result)
+        return tag, result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
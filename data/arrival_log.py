@@ -0,0 +1,189 @@
+import csv
+import os
+from itertools import islice
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from data.data_utils import from_biadjacency
+from IPsolvers.IPsolver import solve_adwords
+from IPsolvers.matching import batched_matching
+from IPsolvers.solver_pool import SolverPool
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+LOG_COLUMNS = ("arrival_id", "offline_id", "weight")
+# rows read at a time from a log, the memory used by a reader is bounded by one chunk and one episode
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def read_table(path, columns, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Reads the columns of a CSV (with a header) or Parquet file chunk_rows rows at a time, without loading
+    the whole file. Yields one list of values per column for each chunk (strings for a CSV file).
+    """
+    if os.path.splitext(path)[1] == ".parquet":
+        assert (
+            pq is not None
+        ), "pyarrow is not installed, it is needed to read {}".format(path)
+        for batch in pq.ParquetFile(path).iter_batches(
+            batch_size=chunk_rows, columns=list(columns)
+        ):
+            yield [batch.column(c).to_pylist() for c in columns]
+        return
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = set(columns) - set(reader.fieldnames or [])
+        assert len(missing) == 0, "{} has no column {}".format(path, missing)
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if len(rows) == 0:
+                return
+            yield [[row[c] for row in rows] for c in columns]
+
+
+def read_offline_nodes(path, with_budgets=False):
+    """
+    The U set of a log: the offline_id column of a CSV or Parquet file, in the order of the nodes of U,
+    and their budget column (float32) for adwords.
+    """
+    columns = ("offline_id", "budget") if with_budgets else ("offline_id",)
+    offline_ids, budgets = [], []
+    for chunk in read_table(path, columns):
+        offline_ids += [str(o) for o in chunk[0]]
+        if with_budgets:
+            budgets += chunk[1]
+    assert len(set(offline_ids)) == len(offline_ids), "{} repeats offline ids".format(
+        path
+    )
+    return offline_ids, np.array(budgets, dtype=np.float32)
+
+
+def iter_episodes(path, offline_ids, v_size, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Splits the arrival log in path (rows of arrival_id, offline_id, weight, e.g. with a timestamp column
+    that is not read) into episodes of v_size consecutive arrivals against the U set offline_ids.
+    The rows are read in file order, which must be the arrival (timestamp) order, with the rows of an
+    arrival next to each other; an arrival without any edge needs a row too (e.g. with an offline_id
+    outside of the U set). Edges to offline nodes outside of offline_ids are dropped, and so is the last
+    episode if it has less than v_size arrivals.
+    Yields the |U| by |V| float32 weight matrix of every episode.
+    """
+    index = {o: k for k, o in enumerate(offline_ids)}
+    weights = np.zeros((len(index), v_size), dtype=np.float32)
+    v, last = -1, None
+    for arrivals, offline, w in read_table(path, LOG_COLUMNS, chunk_rows):
+        for a, o, x in zip(arrivals, offline, w):
+            if a != last:
+                last = a
+                v += 1
+                if v == v_size:
+                    yield weights
+                    weights = np.zeros((len(index), v_size), dtype=np.float32)
+                    v = 0
+            k = index.get(str(o))
+            if k is not None:
+                weights[k, v] = float(x)
+    if v == v_size - 1:
+        yield weights
+
+
+class ArrivalLogDataset(IterableDataset):
+    """
+    Episodes of an arrival log (see iter_episodes), streamed as the same pytorch geometric instances as
+    generate_data.py saves, so that StateEdgeBipartite and StateAdwordsBipartite can be run on them:
+    the optimal matchings of e-obm episodes are labeled label_batch_size at a time by batched_matching,
+    adwords episodes get the budgets of offline_nodes and are solved by a SolverPool.
+    Yields the first size episodes (all of them if None); DataLoader workers take episodes round robin.
+    """
+
+    def __init__(
+        self,
+        problem,
+        log,
+        offline_nodes,
+        size,
+        opts,
+        label_batch_size=256,
+        solver=None,
+        solver_workers=1,
+        solver_cache=None,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+    ):
+        assert problem in (
+            "e-obm",
+            "adwords",
+        ), "Arrival logs are not supported for {}".format(problem)
+        self.problem = problem
+        self.log = log
+        self.offline_ids, self.budgets = read_offline_nodes(
+            offline_nodes, with_budgets=problem == "adwords"
+        )
+        assert (
+            len(self.offline_ids) == opts.u_size
+        ), "{} has {} offline nodes, u_size is {}".format(
+            offline_nodes, len(self.offline_ids), opts.u_size
+        )
+        self.size = size
+        self.u_size = opts.u_size
+        self.v_size = opts.v_size
+        self.label_batch_size = label_batch_size
+        self.solver = solver
+        self.solver_workers = solver_workers
+        self.solver_cache = solver_cache
+        self.chunk_rows = chunk_rows
+
+    def episodes(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (
+            (0, 1) if worker is None else (worker.id, worker.num_workers)
+        )
+        episodes = islice(
+            iter_episodes(self.log, self.offline_ids, self.v_size, self.chunk_rows),
+            self.size,
+        )
+        return islice(episodes, worker_id, None, num_workers)
+
+    def __iter__(self):
+        if self.problem == "e-obm":
+            yield from self._edge_obm_instances()
+        else:
+            yield from self._adwords_instances()
+
+    def _edge_obm_instances(self):
+        episodes = self.episodes()
+        while True:
+            chunk = list(islice(episodes, self.label_batch_size))
+            if len(chunk) == 0:
+                return
+            weights = torch.from_numpy(np.stack(chunk))
+            opts, sols = batched_matching(weights.transpose(1, 2))
+            for w, opt, sol in zip(weights, opts, sols):
+                data = from_biadjacency(w)
+                data.x = sol.clone()
+                data.y = opt.float()
+                yield data
+
+    def _adwords_instances(self):
+        def tasks():
+            for weights in self.episodes():
+                data = from_biadjacency(weights)
+                data.x = torch.from_numpy(self.budgets)
+                yield data, solve_adwords, (
+                    self.u_size,
+                    self.v_size,
+                    weights,
+                    self.budgets,
+                )
+
+        pool = SolverPool(self.solver_workers, self.solver_cache)
+        try:
+            for data, optimal_sol in pool.imap(tasks(), backend=self.solver):
+                data.y = torch.cat(
+                    (torch.tensor([optimal_sol[0]]), torch.tensor(optimal_sol[1]))
+                )
+                yield data
+        finally:
+            pool.close()
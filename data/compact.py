@@ -0,0 +1,109 @@
+import torch
+from torch_geometric.data import Data
+from data.data_utils import from_biadjacency
+
+WEIGHT_DTYPES = {"float16": torch.float16, "float32": torch.float32}
+
+
+def is_compact(data):
+    return "adj_weight" in data
+
+
+def index_dtype(u_size):
+    """
+    The integer dtype of the node indices of a compact instance: int16, or int32 if u_size does not fit
+    """
+    return torch.int16 if u_size < 2**15 else torch.int32
+
+
+def encode_instance(data, layout="dense", weight_dtype="float32"):
+    """
+    Compact encoding of an instance saved by generate_data.py: only its |V| by |U| weights are kept, either
+    dense (adj_weight) or as CSR rows (adj_ptr, adj_col, adj_weight), in weight_dtype, instead of the
+    bidirectional edge_index, weights and dummy edges. Unweighted graphs (osbm) store a bool adjacency.
+    The optimal solutions, x of e-obm and the assignments after the optimal value in y of adwords and osbm
+    (y_sol), are stored as int16 like adj_col (int32 from 2^15 fixed nodes on, see index_dtype), the
+    other attributes are kept as they are.
+    """
+    assert layout in ("dense", "csr"), "Unknown compact layout: {}".format(layout)
+    assert weight_dtype in WEIGHT_DTYPES, "Unknown weight dtype: {}".format(
+        weight_dtype
+    )
+    u_size = int((data.bipartite == 0).sum()) - 1
+    v_size = data.num_nodes - u_size - 1
+    index = index_dtype(u_size)
+    src, dst = data.edge_index
+    # the edges from V to U (the dummy node 0 excluded)
+    e = (src > u_size) & (dst > 0)
+    if "weight" in data:
+        adj = torch.zeros(v_size, u_size, dtype=WEIGHT_DTYPES[weight_dtype])
+        adj[src[e] - u_size - 1, dst[e] - 1] = data.weight[e].to(adj.dtype)
+    else:
+        adj = torch.zeros(v_size, u_size, dtype=torch.bool)
+        adj[src[e] - u_size - 1, dst[e] - 1] = True
+
+    compact = Data(num_nodes=data.num_nodes)
+    compact.uv_size = torch.tensor([u_size, v_size], dtype=torch.long)
+    if layout == "dense":
+        compact.adj_weight = adj
+    else:
+        rows, cols = adj.nonzero(as_tuple=True)
+        compact.adj_ptr = torch.cat(
+            (torch.zeros(1, dtype=torch.int32), (adj != 0).sum(1).cumsum(0).int())
+        )
+        compact.adj_col = cols.to(index)
+        compact.adj_weight = adj[rows, cols]
+    for key in data.keys():
+        if key not in ("edge_index", "weight", "bipartite", "num_nodes"):
+            compact[key] = data[key]
+    if data.x is not None and not data.x.is_floating_point():
+        compact.x = data.x.to(index)
+    if data.y is not None and data.y.dim() == 1 and data.y.numel() == v_size + 1:
+        # the optimal value, then the u + 1 assigned to every arrival
+        compact.y = data.y[:1]
+        compact.y_sol = data.y[1:].to(index)
+    return compact
+
+
+def decode_weights(compact):
+    """
+    The |V| by |U| float32 (bool if unweighted) weight matrix of a compact instance
+    """
+    u_size, v_size = compact.uv_size.tolist()
+    if "adj_ptr" not in compact:
+        adj = compact.adj_weight
+    else:
+        adj = torch.zeros(v_size, u_size, dtype=compact.adj_weight.dtype)
+        rows = torch.repeat_interleave(
+            torch.arange(v_size), (compact.adj_ptr[1:] - compact.adj_ptr[:-1]).long()
+        )
+        adj[rows, compact.adj_col.long()] = compact.adj_weight
+    return adj if adj.dtype == torch.bool else adj.float()
+
+
+def decode_instance(compact, dense_adj=False):
+    """
+    Rebuilds the pytorch geometric instance (as from_biadjacency) from its compact encoding. With dense_adj,
+    its |V| by |U| + 1 adjacency block (see bipartite_block) is attached as well, straight from the weights.
+    """
+    adj = decode_weights(compact)
+    data = from_biadjacency(adj.T, weighted=adj.dtype != torch.bool)
+    if dense_adj:
+        # the extra node is connected to every arrival, with weight 0 in weighted graphs
+        dummy = torch.full((adj.shape[0], 1), float(adj.dtype == torch.bool))
+        data.dense_adj = torch.cat((dummy, adj.float()), dim=1)
+    for key in compact.keys():
+        if key not in (
+            "uv_size",
+            "adj_ptr",
+            "adj_col",
+            "adj_weight",
+            "num_nodes",
+            "y_sol",
+        ):
+            data[key] = compact[key]
+    if compact.x is not None and compact.x.dtype in (torch.int16, torch.int32):
+        data.x = compact.x.long()
+    if "y_sol" in compact:
+        data.y = torch.cat((compact.y, compact.y_sol.to(compact.y.dtype)))
+    return data
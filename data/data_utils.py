@@ -1,3 +1,4 @@
+import hashlib
 import os
 import pickle
 import numpy as np
@@ -20,6 +21,12 @@ movie_lense_edges = "data/MovieLense/edges.txt"
 movie_lense_ratings = "data/MovieLense/ratings.txt"
 movie_lense_feature_weights = "data/MovieLense/feature_weights.txt"
 
+# parsed versions of the raw files above, bump the version when the parsing changes
+parsed_dataset_cache = "data/cache"
+PARSED_CACHE_VERSION = 1
+# parsed datasets already loaded by this process
+_parsed_datasets = {}
+
 
 def add_nodes_with_bipartite_label(G, lena, lenb):
     """
@@ -32,29 +39,21 @@ def add_nodes_with_bipartite_label(G, lena, lenb):
     return G
 
 
-def get_solution(row_ind, col_in, weights, v_size):
+def biadjacency_to_networkx(weights, u_size, v_size):
     """
-    returns a np vector where the index at i is the the node in u that v_i connect to. If index is zero, then v[i]
-    is connected to no node in U.
+    Builds the networkx graph of a bipartite instance from its |U| by |V| weight matrix
     """
-    new_col_in = []
-    # row_ind.sort()
-    col_in = col_in + 1
-    new_col_in += [0] * (row_ind[0])
-
-    for i in range(0, len(row_ind) - 1):
-        if weights[row_ind[i], col_in[i] - 1] != 0.0:
-            new_col_in.append(col_in[i])
-        else:
-            new_col_in.append(0.0)
-        new_col_in += [0.0] * (row_ind[i + 1] - row_ind[i] - 1)
-
-    if weights[row_ind[-1], col_in[-1] - 1] != 0.0:
-        new_col_in.append(col_in[-1])
-    else:
-        new_col_in.append(0.0)
-    new_col_in += [0] * (v_size - row_ind[-1] - 1)
-    return new_col_in
+    G = nx.Graph()
+    G = add_nodes_with_bipartite_label(G, u_size, v_size)
+    u_nodes, v_nodes = np.nonzero(weights)
+    G.add_weighted_edges_from(
+        zip(
+            u_nodes.tolist(),
+            (v_nodes + u_size).tolist(),
+            weights[u_nodes, v_nodes].tolist(),
+        )
+    )
+    return G
 
 
 def check_extension(filename):
@@ -110,46 +109,180 @@ def from_networkx(G):
     return data
 
 
-def parse_gmission_dataset():
-    f_edges = open(gMission_edges, "r")
-    f_tasks = open(gMission_tasks, "r")
-    f_reduced_tasks = open(gMission_reduced_tasks, "r")
-    f_reduced_workers = open(gMission_reduced_workers, "r")
-    edgeWeights = dict()
-    edgeNumber = dict()
-    count = 0
-    for line in f_edges:
-        vals = line.split(",")
-        edgeWeights[vals[0]] = vals[1].split("\n")[0]
-        edgeNumber[vals[0]] = count
-        count += 1
-
-    tasks = list()
-    reduced_tasks = []
-    reduced_workers = []
-    tasks_x = dict()
-    tasks_y = dict()
-
-    for line in f_tasks:
-        vals = line.split(",")
-        tasks.append(vals[0])
-        tasks_x[vals[0]] = float(vals[2])
-        tasks_y[vals[0]] = float(vals[3])
-
-    for t in f_reduced_tasks:
-        reduced_tasks.append(t)
-
-    for w in f_reduced_workers:
-        reduced_workers.append(w)
-
-    return edgeWeights, tasks, reduced_tasks, reduced_workers
+def from_biadjacency(weights, weighted=True):
+    r"""Builds the :class:`torch_geometric.data.Data` instance of a bipartite graph directly from its
+    |U| by |V| weight matrix. The layout is the same as from_networkx on the networkx graph with the extra
+    node -1 (connected to every node in V with weight 0): node 0 is the extra node, nodes 1..u are U and
+    nodes u+1..u+v are V. Edges are stored in both directions and sorted by (source, target).
 
+    Args:
+        weights (np.ndarray or torch.Tensor): |U| by |V| matrix, zero entries are not edges.
+        weighted (bool): whether to store the edge weights under data.weight.
+    """
+    weights = torch.as_tensor(weights)
+    u_size, v_size = weights.shape
+    num_nodes = u_size + v_size + 1
+    u_nodes, v_nodes = torch.nonzero(weights, as_tuple=True)
+    src = torch.cat((torch.zeros(v_size, dtype=torch.long), u_nodes + 1))
+    dst = torch.cat((torch.arange(v_size), v_nodes)) + u_size + 1
+    # the reverse edges sorted by their new source node
+    perm = torch.argsort(dst * num_nodes + src)
+    edge_index = torch.stack(
+        (torch.cat((src, dst[perm])), torch.cat((dst, src[perm]))), dim=0
+    )
+
+    data = torch_geometric.data.Data(edge_index=edge_index, num_nodes=num_nodes)
+    data.bipartite = torch.cat(
+        (
+            torch.zeros(u_size + 1, dtype=torch.long),
+            torch.ones(v_size, dtype=torch.long),
+        )
+    )
+    if weighted:
+        w = torch.cat(
+            (torch.zeros(v_size), weights[u_nodes, v_nodes].to(torch.float32))
+        )
+        data.weight = torch.cat((w, w[perm]))
+    return data
 
-def parse_movie_lense_dataset():
-    f_edges = open(movie_lense_edges, "r")
-    f_movies = open(movie_lense_movies, "r")
-    f_users = open(movie_lense_users, "r")
-    f_feature_weights = open(movie_lense_feature_weights, "r")
+
+def bipartite_block(edge_index, u_size, v_size, weight=None, batch_size=1):
+    """
+    The batch_size by |V| by |U| + 1 block of the dense adjacency of a batch of graphs laid out as
+    from_biadjacency (the nodes of graph b start at b * (u_size + v_size + 1)): the weight of the edge from
+    arrival v to node u, u = 0 being the extra node, or 1 for every edge of unweighted graphs. Same as
+    to_dense_adj(edge_index, batch, weight)[:, u_size + 1 :, : u_size + 1], without the B by
+    (u + v + 1)^2 matrix.
+    """
+    graph_size = u_size + v_size + 1
+    b = edge_index[0] // graph_size
+    src = edge_index[0] - b * graph_size
+    dst = edge_index[1] - b * graph_size
+    e = (src > u_size) & (dst <= u_size)
+    block = torch.zeros(
+        batch_size,
+        v_size,
+        u_size + 1,
+        dtype=torch.float if weight is None else weight.dtype,
+        device=edge_index.device,
+    )
+    block[b[e], src[e] - u_size - 1, dst[e]] = 1.0 if weight is None else weight[e]
+    return block
+
+
+def instance_block(data):
+    """
+    The |V| by |U| + 1 adjacency block (see bipartite_block) of one instance
+    """
+    u_size = int((data.bipartite == 0).sum()) - 1
+    v_size = data.num_nodes - u_size - 1
+    return bipartite_block(data.edge_index, u_size, v_size, data.get("weight"))[0]
+
+
+def dense_bipartite_adj(input, u_size, v_size, weighted=True):
+    """
+    The B by |V| by |U| + 1 adjacency block of a batch of instances: the dense_adj blocks attached to the
+    instances by the datasets when they are read, or scattered from the edges of the batch otherwise.
+    """
+    batch_size = input.batch.size(0) // (u_size + v_size + 1)
+    if "dense_adj" in input:
+        return input.dense_adj.view(batch_size, v_size, u_size + 1)
+    return bipartite_block(
+        input.edge_index,
+        u_size,
+        v_size,
+        input.weight if weighted else None,
+        batch_size,
+    )
+
+
+def sorted_edge_positions(edges):
+    """
+    The positions of the edges of the B by |V| by |U| + 1 bool adjacency block edges (see
+    bipartite_block) in the edge_index of the batch sorted by source, then target, as a 2 by B by |V| by
+    |U| + 1 int32 tensor: the edge from u to v, then the one from v to u. Missing edges point past the end.
+    """
+    batch_size, v_size, num_u = edges.shape
+    num_edges = edges.view(batch_size, -1).sum(1)
+    # the edges of a graph follow those of the previous graphs, the ones out of U first
+    offset = (2 * (num_edges.cumsum(0) - num_edges)).view(-1, 1, 1)
+    from_u = edges.transpose(1, 2).reshape(batch_size, -1).cumsum(1) - 1
+    from_u = from_u.view(batch_size, num_u, v_size).transpose(1, 2) + offset
+    from_v = (edges.view(batch_size, -1).cumsum(1) - 1).view(
+        batch_size, v_size, num_u
+    ) + (offset + num_edges.view(-1, 1, 1))
+    positions = torch.stack((from_u, from_v))
+    return positions.masked_fill(~edges, 2 * num_edges.sum()).int()
+
+
+def load_parsed_dataset(name, sources, parse_fn):
+    """
+    Returns the tuple of arrays parse_fn reads from the raw source files. The result is cached in
+    parsed_dataset_cache as a .npz keyed by PARSED_CACHE_VERSION and the hash of the sources, so the
+    files are only parsed again when they change (or when the version is bumped).
+    Each process loads a dataset once; the arrays are shared by every caller, so they are read-only.
+    """
+    if name not in _parsed_datasets:
+        arrays = _load_parsed_dataset(name, sources, parse_fn)
+        for a in arrays:
+            a.flags.writeable = False
+        _parsed_datasets[name] = arrays
+    return _parsed_datasets[name]
+
+
+def _load_parsed_dataset(name, sources, parse_fn):
+    h = hashlib.sha1(str(PARSED_CACHE_VERSION).encode())
+    for path in sources:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    cache = os.path.join(parsed_dataset_cache, f"{name}_{h.hexdigest()}.npz")
+    if os.path.exists(cache):
+        with np.load(cache) as arrays:
+            return tuple(arrays["arr_{}".format(i)] for i in range(len(arrays.files)))
+    arrays = parse_fn()
+    os.makedirs(parsed_dataset_cache, exist_ok=True)
+    # write then rename, generation jobs running in parallel may fill the cache concurrently
+    tmp = "{}.{}.tmp".format(cache, os.getpid())
+    with open(tmp, "wb") as f:
+        np.savez(f, *arrays)
+    os.replace(tmp, cache)
+    return arrays
+
+
+def read_gmission_dataset():
+    with open(gMission_edges, "r") as f_edges:
+        edges = np.array(
+            [line.replace(";", ",").split(",") for line in f_edges], dtype=float
+        )
+    workers, tasks = edges[:, 0].astype(int), edges[:, 1].astype(int)
+    weights = np.zeros((workers.max() + 1, tasks.max() + 1))
+    weights[workers, tasks] = edges[:, 2]
+
+    with open(gMission_tasks, "r") as f_tasks:
+        tasks = np.array([int(line.split(",")[0]) for line in f_tasks])
+    reduced_tasks = np.loadtxt(gMission_reduced_tasks).astype(int)
+    reduced_workers = np.loadtxt(gMission_reduced_workers).astype(int)
+    return weights, tasks, reduced_tasks, reduced_workers
+
+
+def parse_gmission_dataset():
+    """
+    Returns the dense worker x task matrix of the raw gMission edge weights, indexed by worker and task id
+    (row and column 0 are unused), the ids of all tasks, and the ids of the reduced task and worker sets.
+    """
+    return load_parsed_dataset(
+        "gmission",
+        [
+            gMission_edges,
+            gMission_tasks,
+            gMission_reduced_tasks,
+            gMission_reduced_workers,
+        ],
+        read_gmission_dataset,
+    )
+
+
+def read_movie_lense_dataset():
     num_genres = 15
     gender_map = {"M": 0, "F": 1}
     age_map = {"1": 0, "18": 1, "25": 2, "35": 3, "45": 4, "50": 5, "56": 6}
@@ -170,49 +303,72 @@ def parse_movie_lense_dataset():
         "Thriller": 13,
         "War": 14,
     }
-    users = {}
-    movies = {}
-    edges = {}
-    feature_weights = {}
-    user_ids = []
-    popularity = {}
-    for u in f_users:
-        info = u.split(",")[:4]
-        info[1] = float(gender_map[info[1]])
-        info[2] = float(age_map[info[2]]) / 6.0
-        info[3] = float(info[3]) / 21.0
-        users[info[0]] = info[1:4]
-        user_ids.append(int(info[0]))
-    user_ids.sort()
-    for i, u in enumerate(user_ids):
-        users[str(u)].append(i)
-
-    for m in f_movies:
-        info = m.split("::")
-        genres = info[2].split("|")
-        genres[-1] = genres[-1].split("\n")[0]  # remove "\n" character
-        genres_id = np.array(list(map(lambda g: genre_map[g], genres)))
-        one_hot_encoding = np.zeros(num_genres)
-        one_hot_encoding[genres_id] = 1.0
-        movies[info[0]] = list(one_hot_encoding)
-        popularity[info[0]] = 0
-
-    for e in f_edges:
-        info = e.split(",")
-        genres = info[3].split("|")
-        genres[-1] = genres[-1].split("\n")[0]  # remove "\n" character
-        edges[(info[2], info[1])] = list(map(lambda g: genre_map[g], genres))
-        popularity[info[2]] += 1
-
-    for w in f_feature_weights:
-        feature = w.split(",")
-        feature[-1] = feature[-1].split("\n")[0]  # remove "\n" character
-        if feature[1] not in feature_weights:
-            feature_weights[feature[1]] = [0.0] * num_genres
-        feature_weights[feature[1]][genre_map[feature[0]]] = float(feature[2]) / 5.0
+    with open(movie_lense_users, "r") as f_users:
+        user_info = [line.split(",")[:4] for line in f_users]
+    user_index = {info[0]: i for i, info in enumerate(user_info)}
+    user_ids = np.array([int(info[0]) for info in user_info])
+    users = np.zeros((len(user_info), 4))
+    for i, info in enumerate(user_info):
+        users[i, :3] = (
+            gender_map[info[1]],
+            float(age_map[info[2]]) / 6.0,
+            float(info[3]) / 21.0,
+        )
+    users[:, 3] = np.argsort(np.argsort(user_ids))
+
+    movie_index = {}
+    movie_genres = []
+    with open(movie_lense_movies, "r") as f_movies:
+        for m in f_movies:
+            info = m.split("\n")[0].split("::")  # remove "\n" character
+            movie_index[info[0]] = len(movie_genres)
+            movie_genres.append([genre_map[g] for g in info[2].split("|")])
+    movies = np.zeros((len(movie_genres), num_genres))
+    for i, genres_id in enumerate(movie_genres):
+        movies[i, genres_id] = 1.0
+
+    edges = np.zeros((len(user_info), len(movie_genres)), dtype=bool)
+    popularity = np.zeros(len(movie_genres))
+    with open(movie_lense_edges, "r") as f_edges:
+        for e in f_edges:
+            info = e.split(",")
+            movie = movie_index[info[2]]
+            popularity[movie] += 1
+            if info[1] in user_index:
+                edges[user_index[info[1]], movie] = True
+
+    feature_weights = np.zeros((len(user_info), num_genres))
+    with open(movie_lense_feature_weights, "r") as f_feature_weights:
+        for w in f_feature_weights:
+            feature = w.split("\n")[0].split(",")  # remove "\n" character
+            if feature[1] in user_index:
+                feature_weights[user_index[feature[1]], genre_map[feature[0]]] = (
+                    float(feature[2]) / 5.0
+                )
     return users, movies, edges, feature_weights, popularity
 
 
+def parse_movie_lense_dataset():
+    """
+    Returns the MovieLens data as arrays, users and movies are indexed in file order:
+        users: |users| x 4 features (gender, age, occupation, rank of the user id)
+        movies: |movies| x 15 one-hot encoding of the genres
+        edges: |users| x |movies| incidence matrix, True if the user rated the movie
+        feature_weights: |users| x 15 preference of each user for each genre
+        popularity: number of ratings of each movie
+    """
+    return load_parsed_dataset(
+        "movielense",
+        [
+            movie_lense_users,
+            movie_lense_movies,
+            movie_lense_edges,
+            movie_lense_feature_weights,
+        ],
+        read_movie_lense_dataset,
+    )
+
+
 def find_best_tasks(tasks, edges):
     task_total = {}
     f_open = open("data/gMission/reduced_tasks.txt", "a")
@@ -244,21 +400,24 @@ def find_best_workers(tasks, edges):
 
 
 def generate_weights_geometric(distribution, u_size, v_size, parameters, g1, seed):
+    """
+    Samples the edge weights of the graph g1, given either as a networkx graph or as its |U| by |V|
+    biadjacency matrix.
+    """
     weights, w = 0, 0
     np.random.seed(seed)
-    if distribution == "uniform":
-        weights = nx.bipartite.biadjacency_matrix(
+    if isinstance(g1, np.ndarray):
+        adj = g1.astype(float)
+    else:
+        adj = nx.bipartite.biadjacency_matrix(
             g1, range(0, u_size), range(u_size, u_size + v_size)
-        ).toarray() * np.random.uniform(
+        ).toarray()
+    if distribution == "uniform":
+        weights = adj * np.random.uniform(
             int(parameters[0]), int(parameters[1]), (u_size, v_size)
         )
-        w = torch.cat(
-            (torch.zeros(v_size, 1).float(), torch.tensor(weights).T.float()), 1
-        )
     elif distribution == "normal":
-        weights = nx.bipartite.biadjacency_matrix(
-            g1, range(0, u_size), range(u_size, u_size + v_size)
-        ).toarray() * (
+        weights = adj * (
             np.abs(
                 np.random.normal(
                     int(parameters[0]), int(parameters[1]), (u_size, v_size)
@@ -266,13 +425,8 @@ def generate_weights_geometric(distribution, u_size, v_size, parameters, g1, see
             )
             + 5
         )  # to make sure no edge has weight zero
-        w = torch.cat(
-            (torch.zeros(v_size, 1).float(), torch.tensor(weights).T.float()), 1
-        )
     elif distribution == "power":
-        weights = nx.bipartite.biadjacency_matrix(
-            g1, range(0, u_size), range(u_size, u_size + v_size)
-        ).toarray() * (
+        weights = adj * (
             powerlaw.rvs(
                 int(parameters[0]),
                 int(parameters[1]),
@@ -281,27 +435,15 @@ def generate_weights_geometric(distribution, u_size, v_size, parameters, g1, see
             )
             + 5
         )  # to make sure no edge has weight zero
-        w = torch.cat(
-            (torch.zeros(v_size, 1).float(), torch.tensor(weights).T.float()), 1
-        )
     elif distribution == "degree":
-        weights = nx.bipartite.biadjacency_matrix(
-            g1, range(0, u_size), range(u_size, u_size + v_size)
-        ).toarray()
-        graph = weights * weights.sum(axis=1).reshape(-1, 1)
+        graph = adj * adj.sum(axis=1).reshape(-1, 1)
         noise = np.abs(
             np.random.normal(
                 float(parameters[0]), float(parameters[1]), (u_size, v_size)
             )
         )
         weights = np.where(graph, (graph + noise) / v_size, graph)
-        w = torch.cat(
-            (torch.zeros(v_size, 1).float(), torch.tensor(weights).T.float()), 1
-        )
     elif distribution == "node-normal":
-        adj = nx.bipartite.biadjacency_matrix(
-            g1, range(0, u_size), range(u_size, u_size + v_size)
-        ).toarray()
         mean = np.random.randint(
             float(parameters[0]), float(parameters[1]), (u_size, 1)
         )
@@ -312,9 +454,6 @@ def generate_weights_geometric(distribution, u_size, v_size, parameters, g1, see
             np.abs(np.random.normal(0.0, 1.0, (u_size, v_size)) * variance + mean) + 5
         ) * adj
     elif distribution == "fixed-normal":
-        adj = nx.bipartite.biadjacency_matrix(
-            g1, range(0, u_size), range(u_size, u_size + v_size)
-        ).toarray()
         mean = np.random.choice(np.arange(0, 100, 15), size=(u_size, 1))
         variance = np.sqrt(np.random.choice(np.arange(0, 100, 20), (u_size, 1)))
         weights = (
@@ -1,17 +1,28 @@
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
 from data.data_utils import (
-    add_nodes_with_bipartite_label,
-    get_solution,
+    biadjacency_to_networkx,
+    from_biadjacency,
     parse_gmission_dataset,
     parse_movie_lense_dataset,
-    from_networkx,
     generate_weights_geometric,
 )
-import networkx as nx
+from data.compact import encode_instance
+from data.lazy_dataset import write_lazy_config
+from data.manifest import (
+    finish_manifest,
+    has_manifest,
+    read_manifest,
+    save_instance,
+    start_manifest,
+)
+from data.packed_dataset import DEFAULT_SHARD_SIZE, is_packed_dataset, pack_dataset
 from IPsolvers.IPsolver import solve_submodular_matching, solve_adwords
-from scipy.optimize import linear_sum_assignment
+from IPsolvers.matching import batched_matching
+from IPsolvers.solver_pool import SolverPool
 import torch
 from tqdm import tqdm
 
@@ -21,7 +32,53 @@ from tqdm import tqdm
 gmission_fixed_workers = [229, 521, 527, 80, 54, 281, 508, 317, 94, 351]
 
 
-def generate_ba_graph(
+def sample_er_biadjacency(u, v, p, rng):
+    """
+    Samples the biadjacency matrix (|U| by |V|) of an ER bipartite graph, every edge being present with probability p.
+    Sparse graphs use geometric skips between consecutive edges, drawn in batches, so the cost is linear in the
+    number of edges instead of u * v.
+    """
+    adj = np.zeros((u, v), dtype=bool)
+    if p <= 0:
+        return adj
+    if p >= 0.1:
+        return rng.random((u, v)) < p
+    n, last = u * v, -1
+    batch = int(n * p + 4 * np.sqrt(n * p)) + 16
+    while last < n:
+        positions = last + np.cumsum(rng.geometric(p, size=batch))
+        last = positions[-1]
+        adj.flat[positions[positions < n]] = True
+    return adj
+
+
+def sample_ba_biadjacency(u, v, avg_degree, rng):
+    """
+    Samples the biadjacency matrix (|U| by |V|) of a bipartite preferential attachment graph.
+    Arriving node v draws Binomial(u, avg_degree / u) neighbours, each picked with probability proportional
+    to 1 + (current degree). The picks of a node are i.i.d., so they are drawn as one multinomial sample.
+    """
+    adj = np.zeros((u, v), dtype=bool)
+    degrees = rng.binomial(u, float(avg_degree) / u, size=v)
+    u_deg_list = np.zeros(u)
+    u_nodes = np.arange(u)
+    for v_node in range(v):
+        mu = (1 + u_deg_list) / (u + np.sum(u_deg_list))
+        # The original sampler rejected u_node whenever the edge (u_node, u_node + v_node) existed,
+        # which conditions the picks on the complement of that set. Kept so BA datasets have the same distribution.
+        prev = u_nodes + v_node - u
+        rejected = np.zeros(u, dtype=bool)
+        rejected[prev >= 0] = adj[u_nodes[prev >= 0], prev[prev >= 0]]
+        mu[rejected] = 0.0
+        if mu.sum() == 0:
+            continue
+        counts = rng.multinomial(degrees[v_node], mu / mu.sum())
+        adj[:, v_node] = counts > 0
+        u_deg_list += counts
+    return adj
+
+
+def generate_ba_weights(
     u,
     v,
     tasks,
@@ -37,44 +94,23 @@ def generate_ba_graph(
     capacity_param_2=None,
 ):
     """
-    Genrates a graph using the preferential attachment scheme
+    Genrates the weights of a graph using the preferential attachment scheme
     """
-    np.random.seed(seed)
-    G = nx.Graph()
-    G = add_nodes_with_bipartite_label(G, u, v)
-
-    G.name = f"ba_random_graph({u},{v},{graph_family_parameter})"
-
-    u_deg_list = np.zeros(u)
-
-    for v_node in range(v):
-        degree_v = np.random.binomial(
-            u, float(graph_family_parameter) / u
-        )  # number of neighbours of v
-        mu = (1 + u_deg_list) / (u + np.sum(u_deg_list))
-        num_added = 0
-        while num_added < degree_v:
-            # update current degree of offline nodes
-            u_node = np.random.choice(np.arange(0, u), p=list(mu))
-            if (u_node, u_node + v_node) not in G.edges:
-                G.add_edge(u_node, u + v_node)
-                u_deg_list[u_node] += 1
-                num_added += 1
-
+    adj = sample_ba_biadjacency(
+        u, v, graph_family_parameter, np.random.default_rng(seed)
+    )
     weights, w = generate_weights_geometric(
-        weight_distribution, u, v, weight_param, G, seed
+        weight_distribution, u, v, weight_param, adj, seed
     )
-    d = [dict(weight=float(i)) for i in list(w)]
-    nx.set_edge_attributes(G, dict(zip(list(G.edges), d)))
 
     if capacity_param_1 is not None:
         capacities = np.random.uniform(capacity_param_1, capacity_param_2, u)
-        return G, weights, w, capacities
+        return weights, w, capacities
 
-    return G, weights, w
+    return weights, w
 
 
-def generate_triangular_graph(
+def generate_triangular_weights(
     u,
     v,
     tasks,
@@ -89,35 +125,23 @@ def generate_triangular_graph(
     capacity_param_2=None,
 ):
     """
-    Genrates a randomly permuted uppper triangular graph.
+    Genrates the weights of a randomly permuted uppper triangular graph.
     Note: the weights are generated independet of the options (flags) specified
     """
     np.random.seed(seed)
 
-    G = nx.Graph()
-    G = add_nodes_with_bipartite_label(G, u, v)
-
-    G.name = f"triangular_graph({u},{v},{graph_family_parameter})"
     weight = np.random.uniform(float(weight_param[0]), float(weight_param[1]))
     B = v // u
-    for v_node in range(v):
-        for u_node in range(u):
-            if v_node + 1 <= (u_node + 1) * B:
-                G.add_edge(u_node, u + v_node, weight=weight)
-    # perm = (np.random.permutation(v) + u).tolist()
-    # G = nx.relabel_nodes(G, mapping=dict(zip(list(range(u, u + v)), perm)))
-    perm_u = (np.random.permutation(u)).tolist()
-    G = nx.relabel_nodes(G, mapping=dict(zip(list(range(u)), perm_u)))
-    # generate weights
-    weights = (
-        nx.bipartite.biadjacency_matrix(G, range(0, u), range(u, u + v)).toarray()
-        * weight
-    )
+    adj = (np.arange(v)[None, :] + 1) <= (np.arange(u)[:, None] + 1) * B
+    # offline node i is relabeled to perm_u[i]
+    perm_u = np.random.permutation(u)
+    weights = np.zeros((u, v))
+    weights[perm_u] = adj * weight
     capacities = (v / u) * np.ones(u, dtype=np.float32) * weight
-    return G, weights, None, capacities
+    return weights, None, capacities
 
 
-def generate_thick_z_graph(
+def generate_thick_z_weights(
     u,
     v,
     thick_z_graph,
@@ -132,132 +156,168 @@ def generate_thick_z_graph(
     capacity_param_2=None,
 ):
     """
-    Genrates a randomly permuted thick_z graph.
+    Genrates the weights of a randomly permuted thick_z graph.
     Note1: the weights are generated independet of the options (flags) specified
     Note2: we pass in the thick_z graph as the third input to the function
     """
     np.random.seed(seed)
 
-    G = nx.Graph()
-    G = add_nodes_with_bipartite_label(G, u, v)
-
-    G.name = f"tick-z_graph({u},{v},{graph_family_parameter})"
-
-    # generate graph
     weight = np.random.uniform(float(weight_param[0]), float(weight_param[1]))
-    a = np.zeros((u, v))
     B = v // u
-    for i in range(u):
-        for j in range(B):
-            a[i, min(i * B + j, v - 1)] = 1
-            G.add_edge(i, u + i * B + j, weight=weight)
-        if i >= u / 2:
-            for j in range(v // 2):
-                a[i, j] = 1
-                G.add_edge(i, u + j, weight=weight)
-
-    weights = (
-        nx.bipartite.biadjacency_matrix(G, range(0, u), range(u, u + v)).toarray()
-        * weight
-    )
-    weights = np.random.permutation(weights)
-    perm_u = (np.random.permutation(u)).tolist()
-    G = nx.relabel_nodes(G, mapping=dict(zip(list(range(u)), perm_u)))
-    w = torch.cat((torch.zeros(v, 1).float(), torch.tensor(weights).T.float()), 1)
+    rows, cols = np.arange(u)[:, None], np.arange(v)[None, :]
+    adj = (cols >= rows * B) & (cols < (rows + 1) * B)
+    adj[np.arange(u) >= u / 2, : v // 2] = True
+    # the first permutation is only drawn to keep the random stream of older datasets,
+    # the graph itself relabels offline node i to perm_u[i]
+    np.random.permutation(u)
+    perm_u = np.random.permutation(u)
+    weights = np.zeros((u, v))
+    weights[perm_u] = adj * weight
     w = np.delete(weights.flatten(), weights.flatten() == 0)
 
-    # assert capacity_param_1 is not None
     capacities = (v / u) * np.ones(u, dtype=np.float32) * weight
-    return G, weights, w, capacities
+    return weights, w, capacities
+
+
+def generate_er_weights(
+    u,
+    v,
+    tasks,
+    edges,
+    workers,
+    graph_family_parameter,
+    seed,
+    weight_distribution,
+    weight_param,
+    graph_family=None,
+    vary_fixed=False,
+    capacity_param_1=None,
+    capacity_param_2=None,
+):
+    """
+    Genrates the weights of an ER graph
+    """
+    adj = sample_er_biadjacency(
+        u, v, float(graph_family_parameter), np.random.default_rng(seed)
+    )
+    weights, w = generate_weights_geometric(
+        weight_distribution, u, v, weight_param, adj, seed
+    )
+
+    if capacity_param_1 is not None:
+        capacities = np.random.uniform(capacity_param_1, capacity_param_2, u)
+        return weights, w, capacities
+
+    return weights, w
+
+
+def generate_ba_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_ba_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_ba_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
+
 
+def generate_triangular_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_triangular_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_triangular_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
+
+
+def generate_thick_z_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_thick_z_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_thick_z_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
+
+
+def sample_movie_lense_users(edges, sampled_movies, v):
+    """
+    Samples v users uniformly among the users that rated at least one of the sampled movies.
+    A user without such a rating is redrawn, which consumes the global RNG exactly like drawing
+    one user at a time with np.random.choice.
+    """
+    has_edge = edges[:, sampled_movies].any(axis=1)
+    assert has_edge.any(), "No user rated any of the sampled movies"
+    sampled_users = np.zeros(0, dtype=int)
+    while len(sampled_users) < v:
+        draws = np.random.choice(len(edges), size=v - len(sampled_users))
+        sampled_users = np.concatenate((sampled_users, draws[has_edge[draws]]))
+    return sampled_users
 
-def generate_movie_lense_graph(
+
+def group_movie_lense_users(sampled_users):
+    """
+    Groups the arrivals by user, returns the first arrival of every distinct user (in order of appearance)
+    and {first arrival: [arrivals of the same user]}, used by the IP solver
+    """
+    _, first, inverse = np.unique(sampled_users, return_index=True, return_inverse=True)
+    first_arrival = first[inverse]
+    keys, counts = np.unique(first_arrival, return_counts=True)
+    groups = np.split(np.argsort(first_arrival, kind="stable"), np.cumsum(counts)[:-1])
+    user_freq_dic = {int(k): g.tolist() for k, g in zip(keys, groups)}
+    return keys, user_freq_dic
+
+
+def generate_movie_lense_weights(
     u, v, users, edges, movies, sampled_movies, weight_features, seed, vary_fixed=False
 ):
+    """
+    Samples an osbm instance from MovieLens: U are the sampled movies and every arriving node is a user
+    connected to the movies it rated.
+    """
     np.random.seed(seed)
-    G = nx.Graph()
-    G = add_nodes_with_bipartite_label(G, u, v)
 
-    G.name = f"movielense_random_graph({u},{v})"
+    if vary_fixed:
+        sampled_movies = np.random.choice(len(movies), size=u, replace=False)
+    movies_features = movies[sampled_movies]
 
-    movies_id = np.array(list(movies.keys())).flatten()
-    users_id = np.array(list(users.keys())).flatten()
+    sampled_users = sample_movie_lense_users(edges, sampled_movies, v)
+    incidence = edges[sampled_users][:, sampled_movies]
+    users_features = np.concatenate(
+        (weight_features[sampled_users], users[sampled_users]), axis=1
+    )
 
-    if vary_fixed:
-        sampled_movies = list(np.random.choice(movies_id, size=u, replace=False))
-    movies_features = list(map(lambda m: movies[m], sampled_movies))
-
-    users_features = []
-    user_freq_dic = {}  # {v_id: freq}, used for the IPsolver
-    sampled_users_dic = {}  # {user_id: v_id}
-    # edge_vector_dic = {u: movies_features[u] for u in range(len(sampled_movies))}
-
-    for i in range(v):
-        # construct the graph
-        j = 0
-        while j == 0:
-            sampled_user = np.random.choice(users_id)
-            user_info = list(weight_features[sampled_user]) + users[sampled_user]
-            for w in range(len(sampled_movies)):
-                movie = sampled_movies[w]
-                edge = (movie, sampled_user)
-                if edge in edges and (w, i + u) not in G.edges:
-                    G.add_edge(w, i + u)
-                    j += 1
-
-        # collect data for the IP solver
-        if sampled_user in sampled_users_dic:
-            k = sampled_users_dic[sampled_user]
-            user_freq_dic[k].append(i)
-        else:
-            sampled_users_dic[sampled_user] = i
-            user_freq_dic[i] = [i]
-
-        # append user features for the model
-        users_features.append(user_info)
-
-    # print('r_v: ', user_freq_dic)
-    # print('movies_features: ', movies_features)
-    # construct the preference matrix, used by the IP solver
-    # print("G: \n", nx.adjacency_matrix(G).todense())
-    preference_matrix = np.zeros(
-        (len(sampled_users_dic), 15)
-    )  # 15 is the number of genres
-    # print('sampled_users_dic: ', sampled_users_dic)
-    adjacency_matrix = np.ndarray((len(sampled_users_dic), u))
-    i = 0
-    graph = nx.adjacency_matrix(G).todense()
-    for user_id in sampled_users_dic:
-        preference_matrix[i] = weight_features[user_id]
-        v_id = sampled_users_dic[user_id]
-        # print('v_id: ', v_id)
-        adjacency_matrix[i] = graph[u + v_id, :u]
-        i += 1
-
-    # user_freq = list(map(lambda id: user_freq_dic[id], user_freq_dic)) + [0] * (v - (len(user_freq_dic)))
-    # print('adj_matrix: \n', adjacency_matrix)
+    # collect data for the IP solver
+    first_arrivals, user_freq_dic = group_movie_lense_users(sampled_users)
+    distinct_users = sampled_users[first_arrivals]
+    preference_matrix = weight_features[distinct_users]
+    adjacency_matrix = incidence[first_arrivals].astype(float)
+
+    weights = incidence.T.astype(float)
     return (
-        G,
-        np.array(movies_features),
-        np.array(users_features),
+        weights,
+        movies_features,
+        users_features,
         adjacency_matrix,
         user_freq_dic,
-        movies_features,
         preference_matrix,
     )
 
 
-def generate_capacity(u_size, v_size, max_num_users, popularity, movie):
+def generate_movie_lense_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_movie_lense_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_movie_lense_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
+
+
+def generate_capacity(u_size, v_size, max_num_users, popularity, movies):
     if u_size == 10 and v_size == 30:
         m, v = 1, 0.5
     elif u_size == 10 and v_size == 60:
         m, v = 3, 0.5
-    return ((max_num_users - popularity[movie]) / max_num_users) * 100 + abs(
-        np.random.normal(m, v)
+    return ((max_num_users - popularity[movies]) / max_num_users) * 100 + abs(
+        np.random.normal(m, v, size=len(movies))
     )
 
 
-def generate_movie_lense_adwords_graph(
+def generate_movie_lense_adwords_weights(
     u,
     v,
     users,
@@ -269,84 +329,42 @@ def generate_movie_lense_adwords_graph(
     seed,
     vary_fixed=False,
 ):
+    """
+    Samples an adwords instance from MovieLens: U are the sampled movies and every arriving node is a user
+    connected to the movies it rated, weighted by the user's preference for the genres of the movie.
+    """
     np.random.seed(seed)
-    G = nx.Graph()
-    G = add_nodes_with_bipartite_label(G, u, v)
-
-    G.name = f"movielense_adwords_random_graph({u},{v})"
-
-    movies_id = np.array(list(movies.keys())).flatten()
-    users_id = np.array(list(users.keys())).flatten()
 
     if vary_fixed:
-        sampled_movies = list(np.random.choice(movies_id, size=u, replace=False))
-    movies_features = list(map(lambda m: movies[m], sampled_movies))
+        sampled_movies = np.random.choice(len(movies), size=u, replace=False)
+    movies_features = movies[sampled_movies]
     max_num_users = 200
-    capacities = list(
-        map(
-            lambda m: generate_capacity(u, v, max_num_users, popularity, m),
-            sampled_movies,
-        )
-    )
-    users_features = []
-    user_freq_dic = {}  # {v_id: freq}, used for the IPsolver
-    sampled_users_dic = {}  # {user_id: v_id}
-    # edge_vector_dic = {u: movies_features[u] for u in range(len(sampled_movies))}
+    capacities = generate_capacity(u, v, max_num_users, popularity, sampled_movies)
     max_num_genres = (
         4  # maximum number of genres that any movie belongs (based on data)
     )
-    for i in range(v):
-        # construct the graph
-        j = 0
-        while j == 0:
-            sampled_user = np.random.choice(users_id)
-            user_info = list(weight_features[sampled_user]) + users[sampled_user]
-            for w in range(len(sampled_movies)):
-                movie = sampled_movies[w]
-                edge = (movie, sampled_user)
-                if edge in edges and (w, i + u) not in G.edges:
-                    G.add_edge(
-                        w,
-                        i + u,
-                        weight=(
-                            torch.sum(
-                                torch.tensor(list(weight_features[sampled_user]))
-                                * torch.tensor(movies[movie])
-                            )
-                        ).item()
-                        / max_num_genres,
-                    )
-                    j += 1
-
-        # collect data for the IP solver
-        if sampled_user in sampled_users_dic:
-            k = sampled_users_dic[sampled_user]
-            user_freq_dic[k].append(i)
-        else:
-            sampled_users_dic[sampled_user] = i
-            user_freq_dic[i] = [i]
-
-        # append user features for the model
-        users_features.append(user_info)
-    preference_matrix = np.zeros(
-        (len(sampled_users_dic), 15)
-    )  # 15 is the number of genres
-    # print('sampled_users_dic: ', sampled_users_dic)
-    graph = nx.adjacency_matrix(G).todense()
-    adjacency_matrix = graph[u:, :u]
-    return (
-        G,
-        np.array(movies_features),
-        np.array(users_features),
-        adjacency_matrix,
-        user_freq_dic,
-        movies_features,
-        preference_matrix,
-        capacities,
+
+    sampled_users = sample_movie_lense_users(edges, sampled_movies, v)
+    incidence = edges[sampled_users][:, sampled_movies]
+    users_features = np.concatenate(
+        (weight_features[sampled_users], users[sampled_users]), axis=1
     )
+    _, user_freq_dic = group_movie_lense_users(sampled_users)
 
+    preferences = weight_features[sampled_users] @ movies_features.T
+    weights = (incidence * preferences / max_num_genres).T
+    return weights, movies_features, users_features, user_freq_dic, capacities
 
-def generate_gmission_graph(
+
+def generate_movie_lense_adwords_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_movie_lense_adwords_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_movie_lense_adwords_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
+
+
+def generate_gmission_weights(
     u,
     v,
     tasks,
@@ -359,72 +377,68 @@ def generate_gmission_graph(
     graph_family=None,
     vary_fixed=False,
 ):
+    """
+    Samples a gMission instance: each arriving node is a task drawn uniformly among the tasks that have
+    at least one edge to the workers in U, edges is the dense worker x task weight matrix
+    """
     np.random.seed(seed)
 
-    G = nx.Graph()
-    G = add_nodes_with_bipartite_label(G, u, v)
-
-    G.name = f"gmission_random_graph({u},{v})"
     if vary_fixed:
-        workers = list(np.random.choice(np.arange(1, 533), size=u, replace=False))
-    availableWorkers = workers.copy()
+        workers = np.random.choice(np.arange(1, 533), size=u, replace=False)
+    availableWorkers = np.array(workers)
     if graph_family == "gmission-perm":
         np.random.shuffle(availableWorkers)
-    weights = []
-    for i in range(v):
-        j = 0
-
-        while j == 0:
-            curr_w = []
-            sampledTask = np.random.choice(tasks)
-            for w in range(len(availableWorkers)):
-                worker = availableWorkers[w]
-                edge = str(float(worker)) + ";" + str(float(sampledTask))
-
-                if edge in edges and (w, i + u) not in G.edges:
-                    G.add_edge(w, i + u, weight=float(edges[edge]))
-                    curr_w.append(float(edges[edge]))
-                    j += 1
-                elif edge not in edges:
-                    curr_w.append(float(0))
-        weights += curr_w
-
-    weights = np.array(weights).reshape(v, u).T
-    w = np.delete(weights.flatten(), weights.flatten() == 0)
-    return G, weights, w
+    task_weights = edges[availableWorkers][:, tasks]
+    valid_tasks = np.flatnonzero((task_weights != 0).any(axis=0))
+    assert len(valid_tasks) > 0, "No task has an edge to the sampled workers"
+    weights = task_weights[:, np.random.choice(valid_tasks, size=v)]
+    w = weights[weights != 0]
+    return weights, w
 
 
-def generate_er_graph(
-    u,
-    v,
-    tasks,
-    edges,
-    workers,
-    graph_family_parameter,
-    seed,
-    weight_distribution,
-    weight_param,
-    graph_family=None,
-    vary_fixed=False,
-    capacity_param_1=None,
-    capacity_param_2=None,
-):
+def generate_gmission_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_gmission_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_gmission_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
 
-    g1 = nx.bipartite.random_graph(u, v, graph_family_parameter, seed=seed)
-    weights, w = generate_weights_geometric(
-        weight_distribution, u, v, weight_param, g1, seed
-    )
-    # s = sorted(list(g1.nodes))
-    # c = nx.convert_matrix.to_numpy_array(g1, s)
-    d = [dict(weight=float(i)) for i in list(w)]
-    nx.set_edge_attributes(g1, dict(zip(list(g1.edges), d)))
 
-    if opts.problem == "adwords":
-        assert capacity_param_1 is not None
-        capacities = np.random.uniform(capacity_param_1, capacity_param_2, u)
-        return g1, weights, w, capacities
+def generate_er_graph(u, v, *args, **kwargs):
+    """
+    Same as generate_er_weights, but also returns the networkx graph of the instance
+    """
+    out = generate_er_weights(u, v, *args, **kwargs)
+    return (biadjacency_to_networkx(out[0], u, v),) + out
 
-    return g1, weights, w
+
+def _generate_shard(generate_fn, args, kwargs, ids):
+    return generate_fn(*args, ids=ids, **kwargs)
+
+
+def generate_in_parallel(generate_fn, num_workers, *args, **kwargs):
+    """
+    Shards the instance ids of a dataset (all of them if ids is None) into contiguous chunks and generates
+    each chunk on a process pool.
+    Instance i is always generated from seed + i inside its worker, so the output is bit-identical to a
+    serial run. Workers save their instances as soon as they are done; in-memory datasets are gathered in order.
+    """
+    dataset_size = args[-2]
+    ids = kwargs.pop("ids")
+    ids = np.arange(dataset_size) if ids is None else np.asarray(ids, dtype=int)
+    shards = [s.tolist() for s in np.array_split(ids, num_workers) if len(s) > 0]
+    if len(shards) == 0:
+        return ([], torch.tensor([]), torch.tensor([]))
+    with ProcessPoolExecutor(
+        max_workers=len(shards), initializer=torch.set_num_threads, initargs=(1,)
+    ) as pool:
+        results = list(
+            pool.map(partial(_generate_shard, generate_fn, args, kwargs), shards)
+        )
+    D = [d for r in results for d in r[0]]
+    M = torch.cat([r[1] for r in results])
+    S = torch.cat([r[2] for r in results])
+    return (D, M, S)
 
 
 def generate_osbm_data_geometric(
@@ -438,72 +452,108 @@ def generate_osbm_data_geometric(
     dataset_folder,
     dataset_size,
     save_data,
+    num_workers=1,
+    ids=None,
+    solver=None,
+    solver_workers=1,
+    solver_cache=None,
+    encode=None,
 ):
     """
     Generates edge weighted bipartite graphs using the ER/BA schemes in pytorch geometric format
     Supports uniformm, normal, and power distributions.
+    The optimal solutions are computed with the given solver backend, 'gurobi' or 'highs', on solver_workers
+    processes and cached in the solver_cache file (see IPsolvers).
+    Saved instances are encoded by encode if given (see data/compact.py).
     """
+    if num_workers > 1:
+        return generate_in_parallel(
+            generate_osbm_data_geometric,
+            num_workers,
+            u_size,
+            v_size,
+            weight_distribution,
+            weight_param,
+            graph_family_parameter,
+            seed,
+            graph_family,
+            dataset_folder,
+            dataset_size,
+            save_data,
+            solver=solver,
+            solver_workers=solver_workers,
+            solver_cache=solver_cache,
+            ids=ids,
+            encode=encode,
+        )
+    ids = range(dataset_size) if ids is None else ids
     D, M, S = [], [], []
     vary_fixed = False
     edges, users, movies = None, None, None
     if "movielense" in graph_family:
         users, movies, edges, feature_weights, _ = parse_movie_lense_dataset()
         np.random.seed(2000)
-        movies_id = np.array(list(movies.keys())).flatten()
-        sampled_movies = list(np.random.choice(movies_id, size=u_size, replace=False))
-        g = generate_movie_lense_graph
+        sampled_movies = np.random.choice(len(movies), size=u_size, replace=False)
+        g = generate_movie_lense_weights
         vary_fixed = "var" in graph_family
-    for i in tqdm(range(dataset_size)):
-        (
-            g1,
-            movie_features,
-            user_features,
-            adjacency_matrix,
-            user_freq,
-            movies_features,
-            preference_matrix,
-        ) = g(
-            u_size,
-            v_size,
-            users,
-            edges,
-            movies,
-            sampled_movies,
-            feature_weights,
-            seed + i,
-            vary_fixed,
-        )
-        g1.add_node(
-            -1, bipartite=0
-        )  # add extra node in U that represents not matching the current node to anything
-        g1.add_edges_from(list(zip([-1] * v_size, range(u_size, u_size + v_size))))
-        data = from_networkx(g1)
-        data.x = torch.tensor(
-            np.concatenate((movie_features.flatten(), user_features.flatten()))
-        )
-        optimal_sol = solve_submodular_matching(
-            u_size,
-            len(user_freq),
-            adjacency_matrix,
-            user_freq,
-            movies_features,
-            preference_matrix,
-            v_size,
-        )
+
+    def instances():
+        for i in tqdm(ids):
+            (
+                weights,
+                movie_features,
+                user_features,
+                adjacency_matrix,
+                user_freq,
+                preference_matrix,
+            ) = g(
+                u_size,
+                v_size,
+                users,
+                edges,
+                movies,
+                sampled_movies,
+                feature_weights,
+                seed + i,
+                vary_fixed,
+            )
+            data = from_biadjacency(weights, weighted=False)
+            data.x = torch.tensor(
+                np.concatenate((movie_features.flatten(), user_features.flatten()))
+            )
+            args = (
+                u_size,
+                len(user_freq),
+                adjacency_matrix,
+                user_freq,
+                movie_features,
+                preference_matrix,
+                v_size,
+            )
+            yield (i, data), solve_submodular_matching, args
+
+    pool = SolverPool(solver_workers, solver_cache)
+    for (i, data), optimal_sol in pool.imap(instances(), backend=solver):
         data.y = torch.cat(
             (torch.tensor([optimal_sol[0]]), torch.tensor(optimal_sol[1]))
         )
         if save_data:
-            torch.save(
-                data,
-                "{}/data_{}.pt".format(dataset_folder, i),
-            )
+            save_instance(data, dataset_folder, i, encode)
         else:
             D.append(data)
         # ordered_m = np.take(np.take(m, order, axis=1), order, axis=0)
+    pool.close()
     return (list(D), torch.tensor(M), torch.tensor(S))
 
 
+def sum_of_budgets(u_size, v_size, adjacency_matrix, budgets, backend=None):
+    """
+    Stands in for the optimal solution of the triangular and thick-z families, whose optimal value is the
+    sum of the budgets
+    """
+    return sum(budgets), [0] * v_size
+
+
 def generate_adwords_data_geometric(
     u_size,
     v_size,
@@ -515,13 +565,44 @@ def generate_adwords_data_geometric(
     dataset_folder,
     dataset_size,
     save_data,
+    num_workers=1,
+    ids=None,
+    solver=None,
+    solver_workers=1,
+    solver_cache=None,
+    encode=None,
 ):
     """
     Generates edge weighted bipartite graphs with budgets(ie, capacities) using the ER/BA as well
     as movielens schemes in pytorch geometric format
     Supports uniformm, normal, and power distributions for weigth generation. Uniform for capacity generation.
+    The optimal solutions are computed with the given solver backend, 'gurobi' or 'highs', on solver_workers
+    processes and cached in the solver_cache file (see IPsolvers).
+    Saved instances are encoded by encode if given (see data/compact.py).
     """
+    if num_workers > 1:
+        return generate_in_parallel(
+            generate_adwords_data_geometric,
+            num_workers,
+            u_size,
+            v_size,
+            weight_distribution,
+            weight_param,
+            graph_family_parameter,
+            seed,
+            graph_family,
+            dataset_folder,
+            dataset_size,
+            save_data,
+            solver=solver,
+            solver_workers=solver_workers,
+            solver_cache=solver_cache,
+            ids=ids,
+            encode=encode,
+        )
+    ids = range(dataset_size) if ids is None else ids
     D, M, S = [], [], []
+    pool = SolverPool(solver_workers, solver_cache)
     vary_fixed = False
     edges, users, movies, capacity_param_1, capacity_param_2 = (
         None,
@@ -534,59 +615,54 @@ def generate_adwords_data_geometric(
     if graph_family in ["er", "ba", "triangular", "thick-z"]:
         tasks, workers = None, None
         if graph_family == "er":
-            g = generate_er_graph
+            g = generate_er_weights
             capacity_param_1, capacity_param_2 = 0.01, max(
                 float(v_size / u_size) * float(graph_family_parameter) * 0.5, 1.0
             )
         elif graph_family == "ba":
-            g = generate_ba_graph
+            g = generate_ba_weights
             capacity_param_1, capacity_param_2 = 0.01, max(0.01, 1.0)
         elif graph_family == "triangular":
-            g = generate_triangular_graph
+            g = generate_triangular_weights
         elif graph_family == "thick-z":
-            g = generate_thick_z_graph
-
-        for i in tqdm(range(dataset_size)):
-            g1, weights, w, capacities = g(
-                u_size,
-                v_size,
-                tasks,
-                edges,
-                workers,
-                graph_family_parameter,
-                seed + i,
-                weight_distribution,
-                weight_param,
-                vary_fixed=False,
-                capacity_param_1=capacity_param_1,
-                capacity_param_2=capacity_param_2,
-            )
-            g1.add_node(
-                -1, bipartite=0
-            )  # add extra node in U that represents not matching the current node to anything
-            g1.add_edges_from(
-                list(zip([-1] * v_size, range(u_size, u_size + v_size))), weight=0.0
-            )
-            data = from_networkx(g1)
-            # print(data.weight)
-            # data.weight = torch.tensor(np.around(data.weight.numpy().astype(np.float32), decimals=4))
-            # optimal_sol = 10, []
-            # print(data.weight)
-            data.x = torch.from_numpy(capacities)
-            if graph_family in ["ba", "er"]:
-                # uncomment to get the optimal from the ipsolver
-                optimal_sol = solve_adwords(u_size, v_size, weights, capacities)
-                # optimal_sol = 10, [0] * v_size
-            else:
-                optimal_sol = sum(capacities), [0] * v_size
+            g = generate_thick_z_weights
+
+        def instances():
+            for i in tqdm(ids):
+                weights, w, capacities = g(
+                    u_size,
+                    v_size,
+                    tasks,
+                    edges,
+                    workers,
+                    graph_family_parameter,
+                    seed + i,
+                    weight_distribution,
+                    weight_param,
+                    vary_fixed=False,
+                    capacity_param_1=capacity_param_1,
+                    capacity_param_2=capacity_param_2,
+                )
+                data = from_biadjacency(weights)
+                # print(data.weight)
+                # data.weight = torch.tensor(np.around(data.weight.numpy().astype(np.float32), decimals=4))
+                # optimal_sol = 10, []
+                # print(data.weight)
+                data.x = torch.from_numpy(capacities)
+                if graph_family in ["ba", "er"]:
+                    # uncomment to get the optimal from the ipsolver
+                    solve = solve_adwords
+                    # solve = lambda *args, **kwargs: (10, [0] * v_size)
+                else:
+                    solve = sum_of_budgets
+                yield (i, data), solve, (u_size, v_size, weights, capacities)
+
+        for (i, data), optimal_sol in pool.imap(instances(), backend=solver):
             data.y = torch.cat(
                 (torch.tensor([optimal_sol[0]]), torch.tensor(optimal_sol[1]))
             )
             if save_data:
-                torch.save(
-                    data,
-                    "{}/data_{}.pt".format(dataset_folder, i),
-                )
+                save_instance(data, dataset_folder, i, encode)
             else:
                 D.append(data)
 
@@ -594,53 +670,39 @@ def generate_adwords_data_geometric(
     elif "movielense-ads" in graph_family:
         users, movies, edges, feature_weights, popularity = parse_movie_lense_dataset()
         np.random.seed(2000)
-        movies_id = np.array(list(movies.keys())).flatten()
-        sampled_movies = list(np.random.choice(movies_id, size=u_size, replace=False))
-        g = generate_movie_lense_adwords_graph
+        sampled_movies = np.random.choice(len(movies), size=u_size, replace=False)
+        g = generate_movie_lense_adwords_weights
         vary_fixed = "var" in graph_family
-        for i in tqdm(range(dataset_size)):
-            (
-                g1,
-                movie_features,
-                user_features,
-                adjacency_matrix,
-                user_freq,
-                movies_features,
-                preference_matrix,
-                capacities,
-            ) = g(
-                u_size,
-                v_size,
-                users,
-                edges,
-                movies,
-                popularity,
-                sampled_movies,
-                feature_weights,
-                seed + i,
-                vary_fixed,
-            )
-            g1.add_node(
-                -1, bipartite=0
-            )  # add extra node in U that represents not matching the current node to anything
-            g1.add_edges_from(
-                list(zip([-1] * v_size, range(u_size, u_size + v_size))), weight=0
-            )
-            data = from_networkx(g1)
-            data.x = torch.tensor(capacities)
-            optimal_sol = solve_adwords(u_size, v_size, adjacency_matrix.T, capacities)
+
+        def instances():
+            for i in tqdm(ids):
+                weights, movie_features, user_features, user_freq, capacities = g(
+                    u_size,
+                    v_size,
+                    users,
+                    edges,
+                    movies,
+                    popularity,
+                    sampled_movies,
+                    feature_weights,
+                    seed + i,
+                    vary_fixed,
+                )
+                data = from_biadjacency(weights)
+                data.x = torch.tensor(capacities).float()
+                yield (i, data), solve_adwords, (u_size, v_size, weights, capacities)
+
+        for (i, data), optimal_sol in pool.imap(instances(), backend=solver):
             data.y = torch.cat(
                 (torch.tensor([optimal_sol[0]]), torch.tensor(optimal_sol[1]))
             )
 
             if save_data:
-                torch.save(
-                    data,
-                    "{}/data_{}.pt".format(dataset_folder, i),
-                )
+                save_instance(data, dataset_folder, i, encode)
             else:
                 D.append(data)
         # ordered_m = np.take(np.take(m, order, axis=1), order, axis=0)
+    pool.close()
     return (list(D), torch.tensor(M), torch.tensor(S))
 
 
@@ -655,89 +717,149 @@ def generate_edge_obm_data_geometric(
     dataset_folder,
     dataset_size,
     save_data,
+    num_workers=1,
+    ids=None,
+    label_batch_size=256,
+    encode=None,
+    unit_weights=False,
+    label_method=None,
 ):
     """
     Generates edge weighted bipartite graphs using the ER/BA schemes in pytorch geometric format
     Supports uniformm, normal, and power distributions.
+    The optimal matchings are computed label_batch_size instances at a time with batched_matching, by its
+    method label_method ('sparse' for large sparse graphs).
+    Saved instances are encoded by encode if given (see data/compact.py).
+    With unit_weights, every edge of the sampled graphs gets weight 1 (the instances of obm).
     """
+    if num_workers > 1:
+        return generate_in_parallel(
+            generate_edge_obm_data_geometric,
+            num_workers,
+            u_size,
+            v_size,
+            weight_distribution,
+            weight_param,
+            graph_family_parameter,
+            seed,
+            graph_family,
+            dataset_folder,
+            dataset_size,
+            save_data,
+            ids=ids,
+            label_batch_size=label_batch_size,
+            encode=encode,
+            unit_weights=unit_weights,
+            label_method=label_method,
+        )
+    ids = range(dataset_size) if ids is None else ids
     D, M, S = [], [], []
     vary_fixed = False
     edges, tasks, workers = None, None, None
     if graph_family == "er":
-        g = generate_er_graph
+        g = generate_er_weights
     elif graph_family == "ba":
-        g = generate_ba_graph
+        g = generate_ba_weights
     elif "gmission" in graph_family:
         edges, tasks, reduced_tasks, reduced_workers = parse_gmission_dataset()
-        w = np.array(list(edges.values()), dtype="float")
-        max_w = max(w)
-        edges = {k: (float(v) / float(max_w)) for k, v in edges.items()}
+        edges = edges / edges.max()
         np.random.seed(100)
         rep = (graph_family == "gmission") and (u_size == 10)
         workers = list(np.random.choice(np.arange(1, 533), size=u_size, replace=rep))
         if graph_family == "gmission-max":
             tasks = reduced_tasks
             workers = np.random.choice(reduced_workers, size=u_size, replace=False)
-        g = generate_gmission_graph
+        g = generate_gmission_weights
 
         vary_fixed = "var" in graph_family
     min_weight = 10 ** 7
-    for i in tqdm(range(dataset_size)):
-        g1, weights, w = g(
-            u_size,
-            v_size,
-            tasks,
-            edges,
-            workers,
-            graph_family_parameter,
-            seed + i,
-            weight_distribution,
-            weight_param,
-            vary_fixed=vary_fixed,
-            graph_family=graph_family,
-        )
-        min_weight = min(min_weight, min(w))
-        # d_old = np.array(sorted(g1.degree))[u_size:, 1]
-        g1.add_node(
-            -1, bipartite=0
-        )  # add extra node in U that represents not matching the current node to anything
-        g1.add_edges_from(
-            list(zip([-1] * v_size, range(u_size, u_size + v_size))), weight=0
-        )
-        i1, i2 = linear_sum_assignment(weights.T, maximize=True)
-
-        optimal = (weights.T)[i1, i2].sum()
-
-        solution = get_solution(i1, i2, weights.T, v_size)
-
-        # s = sorted(list(g1.nodes))
-        # m = 1 - nx.convert_matrix.to_numpy_array(g1, s)
-        data = from_networkx(g1)
-        data.x = torch.tensor(
-            solution
-        )  # this is a list, must convert to tensor when a batch is called
-        data.y = torch.tensor(optimal).float()  # tuple of optimla and size of matching
-        if save_data:
-            torch.save(
-                data,
-                "{}/data_{}.pt".format(dataset_folder, i),
+    ids = list(ids)
+    for start in tqdm(range(0, len(ids), label_batch_size)):
+        chunk = ids[start : start + label_batch_size]
+        weights = []
+        for i in chunk:
+            weight, w = g(
+                u_size,
+                v_size,
+                tasks,
+                edges,
+                workers,
+                graph_family_parameter,
+                seed + i,
+                weight_distribution,
+                weight_param,
+                vary_fixed=vary_fixed,
+                graph_family=graph_family,
             )
-        else:
-            D.append(data)
-            M.append(optimal)
+            min_weight = min(min_weight, w.min())
+            if unit_weights:
+                weight = (weight != 0).astype(weight.dtype)
+            weights.append(weight)
+        # label the whole chunk at once, weights are |U| by |V|
+        optimal, solution = batched_matching(
+            torch.from_numpy(np.stack(weights)).transpose(1, 2), label_method
+        )
+        for i, weight, opt, sol in zip(chunk, weights, optimal, solution):
+            data = from_biadjacency(weight)
+            data.x = sol.clone()  # the optimal u + 1 of every arrival, 0 if unmatched
+            data.y = opt.float()
+            if save_data:
+                save_instance(data, dataset_folder, i, encode)
+            else:
+                D.append(data)
+                M.append(opt.item())
         # ordered_m = np.take(np.take(m, order, axis=1), order, axis=0)
     print(min_weight)
     return (list(D), torch.tensor(M), torch.tensor(S))
 
 
-if __name__ == "__main__":
+def generate_obm_data_geometric(*args, **kwargs):
+    """
+    Generates unweighted (obm) instances: the graphs of generate_edge_obm_data_geometric with unit weights,
+    labeled with a maximum matching
+    """
+    return generate_edge_obm_data_geometric(*args, unit_weights=True, **kwargs)
+
+
+def generation_config(opts):
+    """
+    The options of generate_data.py that define the instances of a dataset, instance i being generated
+    from seed + i
+    """
+    return {
+        "problem": opts.problem,
+        "u_size": opts.u_size,
+        "v_size": opts.v_size,
+        "weight_distribution": opts.weight_distribution,
+        "weight_distribution_param": opts.weight_distribution_param,
+        "graph_family_parameter": opts.graph_family_parameter,
+        "seed": opts.seed,
+        "graph_family": opts.graph_family,
+    }
+
+
+def lazy_config(opts, config):
+    """
+    The config of a lazy dataset (see data/lazy_dataset.py) generated from opts
+    """
+    return dict(
+        config,
+        dataset_size=opts.dataset_size,
+        solver=opts.solver,
+        solver_cache=opts.solver_cache,
+        persist=opts.pack,
+        shard_size=opts.shard_size,
+    )
+
+
+def get_options(args=None):
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
         "--problem",
         type=str,
         default="obm",
-        help="Problem: 'e-obm', 'osbm', 'adwords'",
+        help="Problem: 'obm', 'e-obm', 'osbm', 'adwords'",
     )
     parser.add_argument(
         "--weight_distribution",
@@ -818,17 +940,92 @@ if __name__ == "__main__":
         help="Set true to generate datasets for evaluation of model",
     )
     parser.add_argument("--seed", type=int, default=2020, help="Intitial Random seed")
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="Number of processes to generate the dataset with, each one generating a contiguous chunk of instances",
+    )
+    parser.add_argument(
+        "--solver",
+        type=str,
+        default=None,
+        help="MILP backend for the optimal solutions of adwords and osbm: 'gurobi' or 'highs'. Defaults to gurobi if it is installed",
+    )
+    parser.add_argument(
+        "--label_method",
+        type=str,
+        default=None,
+        choices=["torch", "scipy", "sparse"],
+        help="Method of batched_matching labeling the e-obm and obm instances: 'sparse' (scipy's LAPJVsp) "
+        "for large sparse graphs, defaults to 'torch' on the gpu and 'scipy' otherwise",
+    )
+    parser.add_argument(
+        "--solver_workers",
+        type=int,
+        default=1,
+        help="Number of single-threaded solves to run concurrently (per --num_workers process)",
+    )
+    parser.add_argument(
+        "--solver_cache",
+        type=str,
+        default="data/cache/solutions.sqlite",
+        help="File caching the optimal solutions by instance content, pass an empty string to disable",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="Pack the generated instances into shards of --shard_size instances instead of one file each",
+    )
+    parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help="Number of instances per shard of a packed dataset",
+    )
+    parser.add_argument(
+        "--compact",
+        type=str,
+        default=None,
+        help="Save only the |V| by |U| weights of the instances, 'dense' or 'csr' (see data/compact.py)",
+    )
+    parser.add_argument(
+        "--weight_dtype",
+        type=str,
+        default="float32",
+        help="Precision of the weights of compact instances, 'float32' or 'float16'",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only generate the instances missing from the dataset folder (see its manifest.json), "
+        "e.g. after a job died or to extend the dataset to a larger --dataset_size",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Only save the config of the dataset, its instances are generated when they are first read "
+        "(with --pack, they are then saved in packed shards)",
+    )
 
-    opts = parser.parse_args()
+    return parser.parse_args(args)
 
-    if not os.path.exists(opts.dataset_folder):
-        os.makedirs(opts.dataset_folder)
-        if not opts.eval:
-            os.makedirs("{}/graphs".format(opts.dataset_folder))
-    np.random.seed(opts.seed)
 
-    if opts.problem == "e-obm":
-        dataset = generate_edge_obm_data_geometric(
+def generate_dataset(opts, ids=None, num_workers=1):
+    """
+    Generates instances ids (all of them if None) of the dataset defined by opts into opts.dataset_folder
+    """
+    encode = None
+    if opts.compact:
+        encode = partial(
+            encode_instance, layout=opts.compact, weight_dtype=opts.weight_dtype
+        )
+    if opts.problem in ("e-obm", "obm"):
+        generate_fn = {
+            "e-obm": generate_edge_obm_data_geometric,
+            "obm": generate_obm_data_geometric,
+        }[opts.problem]
+        return generate_fn(
             opts.u_size,
             opts.v_size,
             opts.weight_distribution,
@@ -839,9 +1036,13 @@ if __name__ == "__main__":
             opts.dataset_folder,
             opts.dataset_size,
             True,
+            num_workers=num_workers,
+            ids=ids,
+            encode=encode,
+            label_method=opts.label_method,
         )
     elif opts.problem == "osbm":
-        dataset = generate_osbm_data_geometric(
+        return generate_osbm_data_geometric(
             opts.u_size,
             opts.v_size,
             opts.weight_distribution,
@@ -852,9 +1053,15 @@ if __name__ == "__main__":
             opts.dataset_folder,
             opts.dataset_size,
             True,
+            num_workers=num_workers,
+            ids=ids,
+            encode=encode,
+            solver=opts.solver,
+            solver_workers=opts.solver_workers,
+            solver_cache=opts.solver_cache,
         )
     elif opts.problem == "adwords":
-        dataset = generate_adwords_data_geometric(
+        return generate_adwords_data_geometric(
             opts.u_size,
             opts.v_size,
             opts.weight_distribution,
@@ -865,8 +1072,107 @@ if __name__ == "__main__":
             opts.dataset_folder,
             opts.dataset_size,
             True,
+            num_workers=num_workers,
+            ids=ids,
+            encode=encode,
+            solver=opts.solver,
+            solver_workers=opts.solver_workers,
+            solver_cache=opts.solver_cache,
         )
     elif opts.problem == "displayads":
-        pass
+        return None
     else:
         assert False, "Unknown problem: {}".format(opts.problem)
+
+
+def _build_chunk(opts, ids):
+    generate_dataset(opts, ids)
+
+
+def build_datasets(jobs, opts, folders, num_workers=1):
+    """
+    Builds many datasets in one process: jobs are (split, graph_family_parameter, dataset_size, seed)
+    tuples, saved in folders[split]/parameter_{graph_family_parameter}, with the other options taken from
+    opts (see get_options). Jobs whose folder already holds their instances, generated with the same
+    config, are skipped and unfinished ones are resumed. The missing instances of every job are split into
+    chunks and all run on one pool of num_workers processes, each loading the raw datasets once.
+    """
+    todo = []
+    for split, parameter, size, seed in jobs:
+        job_opts = argparse.Namespace(**vars(opts))
+        job_opts.dataset_folder = os.path.join(
+            folders[split], "parameter_{}".format(parameter)
+        )
+        job_opts.graph_family_parameter = float(parameter)
+        job_opts.dataset_size = size
+        job_opts.seed = seed
+        os.makedirs(job_opts.dataset_folder, exist_ok=True)
+        config = generation_config(job_opts)
+        if opts.lazy:
+            write_lazy_config(job_opts.dataset_folder, lazy_config(job_opts, config))
+            continue
+        config = dict(config, compact=opts.compact, weight_dtype=opts.weight_dtype)
+        same_config = has_manifest(job_opts.dataset_folder) and (
+            read_manifest(job_opts.dataset_folder)["config"] == config
+        )
+        if is_packed_dataset(job_opts.dataset_folder):
+            assert (
+                same_config and read_manifest(job_opts.dataset_folder)["size"] >= size
+            ), "Cannot resume {}, it is packed".format(job_opts.dataset_folder)
+            print("{} is up to date".format(job_opts.dataset_folder))
+            continue
+        ids = start_manifest(job_opts.dataset_folder, config, size, resume=same_config)
+        if len(ids) == 0:
+            print("{} is up to date".format(job_opts.dataset_folder))
+        todo.append((job_opts, ids))
+
+    total = sum(len(ids) for _, ids in todo)
+    # a few chunks per worker, so that the pool stays busy until the end
+    chunk_size = max(1, -(-total // (4 * num_workers)))
+    chunks = [
+        (job_opts, ids[c : c + chunk_size])
+        for job_opts, ids in todo
+        for c in range(0, len(ids), chunk_size)
+    ]
+    if num_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=num_workers, initializer=torch.set_num_threads, initargs=(1,)
+        ) as pool:
+            list(pool.map(_build_chunk, *zip(*chunks)))
+    else:
+        for job_opts, ids in chunks:
+            _build_chunk(job_opts, ids)
+
+    for job_opts, _ in todo:
+        finish_manifest(job_opts.dataset_folder)
+        if opts.pack:
+            pack_dataset(job_opts.dataset_folder, opts.shard_size, remove=True)
+
+
+if __name__ == "__main__":
+    opts = get_options()
+
+    if not os.path.exists(opts.dataset_folder):
+        os.makedirs(opts.dataset_folder)
+        if not opts.eval:
+            os.makedirs("{}/graphs".format(opts.dataset_folder))
+    np.random.seed(opts.seed)
+
+    config = generation_config(opts)
+    if opts.lazy:
+        write_lazy_config(opts.dataset_folder, lazy_config(opts, config))
+    else:
+        assert not (
+            opts.resume and is_packed_dataset(opts.dataset_folder)
+        ), "Cannot resume {}, it is packed".format(opts.dataset_folder)
+        # only the instances that are not completed yet are generated
+        ids = start_manifest(
+            opts.dataset_folder,
+            dict(config, compact=opts.compact, weight_dtype=opts.weight_dtype),
+            opts.dataset_size,
+            resume=opts.resume,
+        )
+        generate_dataset(opts, ids, num_workers=opts.num_workers)
+        finish_manifest(opts.dataset_folder)
+        if opts.pack:
+            pack_dataset(opts.dataset_folder, opts.shard_size, remove=True)
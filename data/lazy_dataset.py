@@ -0,0 +1,159 @@
+import json
+import os
+from collections import OrderedDict
+import torch
+from data.manifest import check_manifest, has_manifest
+from data.packed_dataset import (
+    INDEX_FILE,
+    PACKED_VERSION,
+    SHARD_FILE,
+    PackedDataset,
+    is_packed_dataset,
+    load_shard,
+    pack_shard,
+    unpack_instance,
+)
+from data.stream_dataset import generate_instances
+
+CONFIG_FILE = "lazy_config.json"
+
+
+def is_lazy_dataset(folder):
+    return isinstance(folder, str) and os.path.exists(os.path.join(folder, CONFIG_FILE))
+
+
+def write_lazy_config(folder, config):
+    """
+    Defines the dataset in folder by its generation config (the options of generate_data.py) instead of its
+    instances. config needs problem, u_size, v_size, weight_distribution, weight_distribution_param,
+    graph_family_parameter, seed, graph_family and dataset_size; persist and shard_size are optional.
+    """
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=4)
+
+
+class LazyDataset(object):
+    """
+    Random access dataset whose instance i is generated with generate_fn from (seed + i, config) the first
+    time it is read, exactly as generate_data.py would have saved it, and kept in an LRU cache of cache_size
+    instances. With config["persist"], instances are generated a packed shard at a time instead and the
+    shards are saved in the folder (and memory-mapped), so each one is generated once per machine; once
+    every shard is on disk the folder is a regular packed dataset.
+    """
+
+    def __init__(self, folder, generate_fn, cache_size=1000, mmap=True):
+        with open(os.path.join(folder, CONFIG_FILE)) as f:
+            config = json.load(f)
+        self.folder = folder
+        self.size = config["dataset_size"]
+        self.generate_fn = generate_fn
+        self.args = (
+            config["u_size"],
+            config["v_size"],
+            config["weight_distribution"],
+            config["weight_distribution_param"],
+            config["graph_family_parameter"],
+            config["seed"],
+            config["graph_family"],
+        )
+        self.kwargs = {}
+        if config["problem"] not in ("e-obm", "obm"):
+            self.kwargs = {
+                "solver": config.get("solver"),
+                "solver_cache": config.get("solver_cache"),
+            }
+        self.persist = config.get("persist", False)
+        self.shard_size = config.get("shard_size", 4096)
+        self.cache_size = cache_size
+        self.mmap = mmap
+        self.cache = OrderedDict()
+        self.shards = {}
+
+    def __getstate__(self):
+        # DataLoader workers fill their own cache and map the shards themselves
+        state = self.__dict__.copy()
+        state["cache"] = OrderedDict()
+        state["shards"] = {}
+        return state
+
+    def __len__(self):
+        return self.size
+
+    def _shard_ids(self, shard_id):
+        return range(
+            shard_id * self.shard_size, min((shard_id + 1) * self.shard_size, self.size)
+        )
+
+    def _get_shard(self, shard_id):
+        if shard_id in self.shards:
+            return self.shards[shard_id]
+        path = os.path.join(self.folder, SHARD_FILE.format(shard_id))
+        if not os.path.exists(path):
+            shard = pack_shard(
+                generate_instances(
+                    self.generate_fn,
+                    self.args,
+                    self._shard_ids(shard_id),
+                    **self.kwargs
+                )
+            )
+            # concurrent readers of the folder only ever see complete shards
+            torch.save(shard, path + ".tmp{}".format(os.getpid()))
+            os.replace(path + ".tmp{}".format(os.getpid()), path)
+            self._write_index()
+        self.shards[shard_id] = load_shard(path, self.mmap)
+        return self.shards[shard_id]
+
+    def _write_index(self):
+        num_shards = (self.size + self.shard_size - 1) // self.shard_size
+        if all(
+            os.path.exists(os.path.join(self.folder, SHARD_FILE.format(s)))
+            for s in range(num_shards)
+        ):
+            index = {
+                "version": PACKED_VERSION,
+                "size": self.size,
+                "shard_size": self.shard_size,
+            }
+            torch.save(index, os.path.join(self.folder, INDEX_FILE))
+
+    def __getitem__(self, idx):
+        assert 0 <= idx < self.size, "Index {} out of range for {}".format(
+            idx, self.folder
+        )
+        if idx in self.cache:
+            self.cache.move_to_end(idx)
+            return self.cache[idx]
+        if self.persist:
+            shard = self._get_shard(idx // self.shard_size)
+            self._put(idx, unpack_instance(shard, idx % self.shard_size))
+        else:
+            (data,) = generate_instances(
+                self.generate_fn, self.args, [idx], **self.kwargs
+            )
+            self._put(idx, data)
+        return self.cache[idx]
+
+    def _put(self, idx, data):
+        self.cache[idx] = data
+        self.cache.move_to_end(idx)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+
+def open_dataset(folder, size, generate_fn, opts):
+    """
+    Reader for the dataset folder of make_dataset: a PackedDataset, a LazyDataset generated by generate_fn,
+    or the folder itself when it holds data_{i}.pt files. If the folder has a manifest, its first size
+    instances are checked to be complete.
+    """
+    if has_manifest(folder):
+        check_manifest(folder, size)
+    if is_packed_dataset(folder):
+        return PackedDataset(folder, mmap=not opts.no_mmap)
+    if is_lazy_dataset(folder):
+        return LazyDataset(
+            folder, generate_fn, cache_size=opts.lazy_cache_size, mmap=not opts.no_mmap
+        )
+    return folder
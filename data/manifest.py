@@ -0,0 +1,128 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import torch
+from data.packed_dataset import is_packed_dataset
+
+MANIFEST_FILE = "manifest.json"
+# completed instances are appended here while a generation job runs, one "i checksum" line each
+COMPLETED_LOG = "manifest.log"
+
+
+def has_manifest(folder):
+    return isinstance(folder, str) and os.path.exists(
+        os.path.join(folder, MANIFEST_FILE)
+    )
+
+
+def save_instance(data, folder, i, encode=None):
+    """
+    Saves instance i as data_{i}.pt, encoded by encode if given (e.g. data.compact.encode_instance), and
+    records it as completed, with the sha1 of the file, in the completed log. The file is written atomically,
+    so an instance in the log is always a complete file, even if the job is killed. Safe to call from
+    concurrent workers.
+    """
+    buffer = io.BytesIO()
+    torch.save(data if encode is None else encode(data), buffer)
+    content = buffer.getvalue()
+    path = os.path.join(folder, "data_{}.pt".format(i))
+    with open(path + ".tmp", "wb") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+    with open(os.path.join(folder, COMPLETED_LOG), "a") as f:
+        f.write("{} {}\n".format(i, hashlib.sha1(content).hexdigest()))
+
+
+def read_manifest(folder):
+    """
+    Returns the manifest of folder with the instances of the completed log (of an unfinished job) merged in.
+    """
+    with open(os.path.join(folder, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    log = os.path.join(folder, COMPLETED_LOG)
+    if os.path.exists(log):
+        with open(log) as f:
+            for line in f:
+                fields = line.split()
+                # the last line of a killed job may be cut short
+                if len(fields) == 2 and len(fields[1]) == 40:
+                    manifest["instances"][fields[0]] = fields[1]
+    return manifest
+
+
+def _write_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def start_manifest(folder, config, size, resume=False):
+    """
+    Starts generating instances 0..size - 1 of the dataset in folder from config (the generate_data.py
+    options that define the instances, instance i being generated from config["seed"] + i).
+    With resume, the instances already completed by previous jobs with the same config are kept; this also
+    extends a dataset to a larger size. Returns the ids left to generate.
+    """
+    manifest = {"config": config, "size": 0, "instances": {}}
+    if resume and has_manifest(folder):
+        manifest = read_manifest(folder)
+        assert (
+            manifest["config"] == config
+        ), "Cannot resume {}, it was generated with another config: {}".format(
+            folder, manifest["config"]
+        )
+    manifest["size"] = max(manifest["size"], size)
+    manifest["seeds"] = [config["seed"], config["seed"] + manifest["size"] - 1]
+    _write_manifest(folder, manifest)
+    if os.path.exists(os.path.join(folder, COMPLETED_LOG)):
+        os.remove(os.path.join(folder, COMPLETED_LOG))
+    return [i for i in range(size) if str(i) not in manifest["instances"]]
+
+
+def finish_manifest(folder):
+    """
+    Merges the completed log of the job into the manifest
+    """
+    _write_manifest(folder, read_manifest(folder))
+    if os.path.exists(os.path.join(folder, COMPLETED_LOG)):
+        os.remove(os.path.join(folder, COMPLETED_LOG))
+
+
+def check_manifest(folder, size, checksums=False):
+    """
+    Checks that instances 0..size - 1 of the dataset in folder were all generated, from its manifest
+    alone unless checksums is set, in which case every data_{i}.pt file is also hashed and compared.
+    """
+    manifest = read_manifest(folder)
+    missing = [i for i in range(size) if str(i) not in manifest["instances"]]
+    assert (
+        len(missing) == 0
+    ), "{} has {} missing instances out of {} (e.g. {}), resume its generation with --resume".format(
+        folder, len(missing), size, missing[0]
+    )
+    if checksums:
+        for i in range(size):
+            with open(os.path.join(folder, "data_{}.pt".format(i)), "rb") as f:
+                checksum = hashlib.sha1(f.read()).hexdigest()
+            assert checksum == manifest["instances"][str(i)], "{} is corrupted".format(
+                os.path.join(folder, "data_{}.pt".format(i))
+            )
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the instances of generated datasets against their manifest"
+    )
+    parser.add_argument("folders", nargs="+", help="Dataset folders")
+    opts = parser.parse_args()
+    for folder in opts.folders:
+        manifest = read_manifest(folder)
+        # the files of packed datasets are gone, only the manifest can be checked
+        check_manifest(
+            folder, manifest["size"], checksums=not is_packed_dataset(folder)
+        )
+        print("{}: {} instances ok".format(folder, manifest["size"]))
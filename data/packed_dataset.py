@@ -0,0 +1,215 @@
+import argparse
+import inspect
+import os
+import torch
+from torch_geometric.data import Data
+from tqdm import tqdm
+
+PACKED_VERSION = 1
+INDEX_FILE = "packed_index.pt"
+SHARD_FILE = "packed_{}.pt"
+DEFAULT_SHARD_SIZE = 4096
+# the keywords of torch.load of the installed torch: mmap from 2.1, weights_only from 1.13
+LOAD_KEYWORDS = inspect.signature(torch.load).parameters
+
+
+def load_shard(path, mmap=True):
+    """
+    Loads a shard of tensors, memory-mapped if mmap and the installed torch supports it
+    """
+    if mmap and "mmap" in LOAD_KEYWORDS:
+        return torch.load(path, mmap=True)
+    return torch.load(path)
+
+
+def load_instance(path):
+    """
+    Loads a data_{i}.pt instance: a pickled Data object, which torch >= 2.6 only loads with
+    weights_only=False
+    """
+    if "weights_only" in LOAD_KEYWORDS:
+        return torch.load(path, weights_only=False)
+    return torch.load(path)
+
+
+def is_packed_dataset(folder):
+    return isinstance(folder, str) and os.path.exists(os.path.join(folder, INDEX_FILE))
+
+
+def pack_shard(data_list):
+    """
+    Packs a list of Data instances into one dict of tensors. Every attribute is concatenated along its
+    PyG cat dimension (the edge dimension for edge_index) and ptr[key][i]:ptr[key][i + 1] is the slice of
+    instance i. 0-dim attributes (the optimal value of e-obm) are stored as 1-element slices.
+    """
+    keys = sorted(k for k in data_list[0].keys() if k != "num_nodes")
+    shard = {"keys": {}, "values": {}, "ptr": {}}
+    shard["num_nodes"] = torch.tensor(
+        [d.num_nodes for d in data_list], dtype=torch.long
+    )
+    for key in keys:
+        values = [torch.as_tensor(d[key]) for d in data_list]
+        scalar = values[0].dim() == 0
+        if scalar:
+            values = [v.view(1) for v in values]
+        cat_dim = data_list[0].__cat_dim__(key, values[0]) % values[0].dim()
+        sizes = torch.tensor([v.size(cat_dim) for v in values], dtype=torch.long)
+        shard["keys"][key] = {"cat_dim": cat_dim, "scalar": scalar}
+        shard["values"][key] = torch.cat(values, dim=cat_dim)
+        shard["ptr"][key] = torch.cat(
+            (torch.zeros(1, dtype=torch.long), sizes.cumsum(0))
+        )
+    return shard
+
+
+def unpack_instance(shard, i):
+    """
+    Returns instance i of a packed shard. The tensors are views into the shard, nothing is copied.
+    """
+    data = Data(num_nodes=int(shard["num_nodes"][i]))
+    for key, meta in shard["keys"].items():
+        start, end = shard["ptr"][key][i], shard["ptr"][key][i + 1]
+        value = shard["values"][key].narrow(meta["cat_dim"], start, end - start)
+        data[key] = value[0] if meta["scalar"] else value
+    return data
+
+
+class PackedWriter(object):
+    """
+    Streams Data instances into shards of shard_size instances each.
+    The index is written by close(), so a folder is only detected as packed once every shard is on disk.
+    """
+
+    def __init__(self, folder, shard_size=DEFAULT_SHARD_SIZE):
+        assert shard_size > 0, "shard_size must be positive"
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.shard_size = shard_size
+        self.size = 0
+        self.buffer = []
+
+    def add(self, data):
+        self.buffer.append(data)
+        self.size += 1
+        if len(self.buffer) == self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        if len(self.buffer) == 0:
+            return
+        shard_id = (self.size - 1) // self.shard_size
+        torch.save(
+            pack_shard(self.buffer),
+            os.path.join(self.folder, SHARD_FILE.format(shard_id)),
+        )
+        self.buffer = []
+
+    def close(self):
+        self._flush()
+        index = {
+            "version": PACKED_VERSION,
+            "size": self.size,
+            "shard_size": self.shard_size,
+        }
+        torch.save(index, os.path.join(self.folder, INDEX_FILE))
+
+
+class PackedDataset(object):
+    """
+    Random access reader of a packed dataset folder. Shards are loaded on first access and kept in memory,
+    instance idx lives in shard idx // shard_size.
+    With mmap, shards are memory-mapped instead of read (torch >= 2.1, see load_shard), so instances are
+    zero-copy views into the page cache and every process reading the same folder shares one physical copy
+    of it.
+    """
+
+    def __init__(self, folder, mmap=True):
+        index = torch.load(os.path.join(folder, INDEX_FILE))
+        assert (
+            index["version"] == PACKED_VERSION
+        ), "Unsupported packed dataset version {} in {}".format(
+            index["version"], folder
+        )
+        self.folder = folder
+        self.size = index["size"]
+        self.shard_size = index["shard_size"]
+        self.mmap = mmap
+        self.shards = {}
+
+    def __getstate__(self):
+        # DataLoader workers map the shards themselves instead of receiving a copy
+        state = self.__dict__.copy()
+        state["shards"] = {}
+        return state
+
+    def __len__(self):
+        return self.size
+
+    def _get_shard(self, shard_id):
+        if shard_id not in self.shards:
+            path = os.path.join(self.folder, SHARD_FILE.format(shard_id))
+            self.shards[shard_id] = load_shard(path, self.mmap)
+        return self.shards[shard_id]
+
+    def __getitem__(self, idx):
+        assert 0 <= idx < self.size, "Index {} out of range for {}".format(
+            idx, self.folder
+        )
+        shard = self._get_shard(idx // self.shard_size)
+        return unpack_instance(shard, idx % self.shard_size)
+
+
+def pack_dataset(folder, shard_size=DEFAULT_SHARD_SIZE, remove=False):
+    """
+    Converts a folder of data_{i}.pt files into the packed format, in place.
+    """
+    size = 0
+    while os.path.exists(os.path.join(folder, "data_{}.pt".format(size))):
+        size += 1
+    assert size > 0, "No data_{{i}}.pt files in {}".format(folder)
+    writer = PackedWriter(folder, shard_size)
+    for i in tqdm(range(size), desc=folder):
+        writer.add(load_instance(os.path.join(folder, "data_{}.pt".format(i))))
+    writer.close()
+    if remove:
+        for i in range(size):
+            os.remove(os.path.join(folder, "data_{}.pt".format(i)))
+    return size
+
+
+def find_unpacked_datasets(root):
+    """
+    Finds every folder under root (e.g. dataset/train/.../parameter_*) that still holds data_{i}.pt files
+    """
+    folders = []
+    for dirpath, _, filenames in os.walk(root):
+        if "data_0.pt" in filenames and INDEX_FILE not in filenames:
+            folders.append(dirpath)
+    return sorted(folders)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert data_{i}.pt dataset folders to the packed shard format"
+    )
+    parser.add_argument(
+        "roots",
+        nargs="+",
+        help="Dataset folders or roots to search, e.g. dataset/train dataset/val dataset/eval",
+    )
+    parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help="Number of instances per shard",
+    )
+    parser.add_argument(
+        "--remove",
+        action="store_true",
+        help="Delete the data_{i}.pt files once a folder is packed",
+    )
+    opts = parser.parse_args()
+    for root in opts.roots:
+        for folder in find_unpacked_datasets(root):
+            size = pack_dataset(folder, opts.shard_size, opts.remove)
+            print("Packed {} instances in {}".format(size, folder))
@@ -0,0 +1,193 @@
+import torch
+from torch.utils.data import ConcatDataset, DataLoader, Sampler
+from torch_geometric.data import Batch
+from data.data_utils import from_biadjacency, instance_block
+from data.manifest import has_manifest, read_manifest
+
+
+def instance_size(data):
+    """
+    |U| and |V| of an instance laid out as from_biadjacency
+    """
+    u_size = int((data.bipartite == 0).sum()) - 1
+    return u_size, data.num_nodes - u_size - 1
+
+
+def pad_instance(data, u_size, v_size, problem, num_genres=15):
+    """
+    Pads an instance of problem to u_size fixed nodes and v_size arrivals: the extra fixed nodes have no
+    edges, so they can never be matched, and the extra arrivals, at the end of the episode, are only
+    connected to the extra node 0, so they can only be skipped. The optimal value is unchanged. The node
+    features and labels (x and y) are padded with zeros, and the size of the instance before padding is
+    kept in sizes, a 1 by 2 tensor (|U|, |V|) collated into the B by 2 sizes of a batch.
+    """
+    u, v = instance_size(data)
+    block = data.dense_adj if "dense_adj" in data else instance_block(data)
+    if (u, v) == (u_size, v_size):
+        padded = data.clone()
+        padded.dense_adj = block
+    else:
+        assert (
+            u <= u_size and v <= v_size
+        ), "Cannot pad an instance of size {} by {} to {} by {}".format(
+            u, v, u_size, v_size
+        )
+        weighted = "weight" in data
+        dense_adj = torch.zeros(v_size, u_size + 1, dtype=block.dtype)
+        # the extra node is connected to every arrival, with weight 0 in weighted graphs
+        dense_adj[:, 0] = float(not weighted)
+        dense_adj[:v, : u + 1] = block
+        padded = from_biadjacency(
+            dense_adj[:, 1:].T if weighted else dense_adj[:, 1:].T != 0,
+            weighted=weighted,
+        )
+        padded.dense_adj = dense_adj
+        padded.x, padded.y = _pad_labels(
+            data, u, v, u_size, v_size, problem, num_genres
+        )
+    padded.sizes = torch.tensor([[u, v]])
+    return padded
+
+
+def _pad_labels(data, u, v, u_size, v_size, problem, num_genres):
+    x, y = data.x, data.y
+    if problem in ("e-obm", "obm"):
+        # the optimal u + 1 of every arrival, 0 if unmatched
+        return torch.cat((x, x.new_zeros(v_size - v))), y
+    y = torch.cat((y, y.new_zeros(v_size - v)))
+    if problem == "adwords":
+        return torch.cat((x, x.new_zeros(u_size - u))), y
+    # osbm: the genres of every movie, then the features of every user
+    movies, users = x[: u * num_genres], x[u * num_genres :].view(v, -1)
+    return (
+        torch.cat(
+            (
+                movies,
+                movies.new_zeros((u_size - u) * num_genres),
+                users.flatten(),
+                users.new_zeros((v_size - v) * users.size(1)),
+            )
+        ),
+        y,
+    )
+
+
+def padded_v_size(input, v_size):
+    """
+    The number of arrivals of the episodes of a batch: the v_size of the padded batches of RaggedCollater
+    """
+    return input.v_size if "v_size" in input else v_size
+
+
+def instance_sizes(input, batch_size, u_size, v_size, device):
+    """
+    The B by 1 float tensors of the |U| and |V| of the instances of a batch before padding (see
+    pad_instance), u_size and v_size for batches that are not padded.
+    """
+    if "sizes" not in input:
+        sizes = torch.tensor([[u_size, v_size]], device=device).expand(batch_size, 2)
+    else:
+        sizes = input.sizes
+    return sizes[:, :1].float(), sizes[:, 1:].float()
+
+
+class RaggedCollater(object):
+    """
+    Collates instances of different sizes into one batch: they are padded (see pad_instance) to u_size
+    fixed nodes, the width of the models, and to the largest number of arrivals in the batch, which is
+    kept as the v_size of the batch (see padded_v_size).
+    """
+
+    def __init__(self, problem, u_size, num_genres=15):
+        self.problem = problem
+        self.u_size = u_size
+        self.num_genres = num_genres
+
+    def __call__(self, data_list):
+        v_size = max(instance_size(data)[1] for data in data_list)
+        batch = Batch.from_data_list(
+            [
+                pad_instance(data, self.u_size, v_size, self.problem, self.num_genres)
+                for data in data_list
+            ]
+        )
+        batch.v_size = v_size
+        return batch
+
+
+class SizeBucketSampler(Sampler):
+    """
+    Batch sampler of a mixed size dataset: the instances are sorted by size (|V|, then |U|) and cut into
+    batches of batch_size, so that every batch but the last is full and is padded to little more than the
+    sizes of its instances. With shuffle, the instances of a size and the order of the batches are drawn
+    again at every pass.
+    """
+
+    def __init__(self, sizes, batch_size, shuffle=False, drop_last=False):
+        self.sizes = torch.tensor(sizes, dtype=torch.long).view(-1, 2)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __iter__(self):
+        n = len(self.sizes)
+        order = torch.randperm(n) if self.shuffle else torch.arange(n)
+        key = self.sizes[order, 1] * (self.sizes[:, 0].max() + 1) + self.sizes[order, 0]
+        order = order[torch.sort(key, stable=True)[1]]
+        batches = list(torch.split(order, self.batch_size))
+        if self.drop_last and len(batches[-1]) < self.batch_size:
+            batches = batches[:-1]
+        if self.shuffle:
+            batches = [batches[k] for k in torch.randperm(len(batches))]
+        for batch in batches:
+            yield batch.tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.sizes) // self.batch_size
+        return (len(self.sizes) + self.batch_size - 1) // self.batch_size
+
+
+class RaggedDataset(ConcatDataset):
+    """
+    The instances of several datasets, of different graph sizes, with the (|U|, |V|) of every instance
+    in sizes
+    """
+
+    def __init__(self, datasets, sizes):
+        super(RaggedDataset, self).__init__(datasets)
+        assert len(sizes) == len(self), "{} sizes for {} instances".format(
+            len(sizes), len(self)
+        )
+        self.sizes = sizes
+
+
+def make_ragged_dataset(problem, folders, size, opts):
+    """
+    The RaggedDataset of the first size instances of each of the comma separated dataset folders. Their
+    sizes are read from the manifests of the folders, or from the instances of folders without one.
+    """
+    datasets, sizes = [], []
+    for folder in folders.split(","):
+        dataset = problem.make_dataset(folder, size, opts.problem, seed=None, opts=opts)
+        if has_manifest(folder):
+            config = read_manifest(folder)["config"]
+            sizes += [(config["u_size"], config["v_size"])] * len(dataset)
+        else:
+            sizes += [instance_size(dataset[i]) for i in range(len(dataset))]
+        datasets.append(dataset)
+    return RaggedDataset(datasets, sizes)
+
+
+def ragged_dataloader(dataset, opts, shuffle=False, drop_last=False):
+    """
+    DataLoader over a RaggedDataset, in padded batches of instances of similar sizes (see
+    SizeBucketSampler and RaggedCollater)
+    """
+    return DataLoader(
+        dataset,
+        batch_sampler=SizeBucketSampler(
+            dataset.sizes, opts.batch_size, shuffle=shuffle, drop_last=drop_last
+        ),
+        collate_fn=RaggedCollater(opts.problem, opts.u_size, opts.num_genres),
+    )
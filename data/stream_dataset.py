@@ -0,0 +1,91 @@
+import os
+from contextlib import redirect_stderr, redirect_stdout
+from torch.utils.data import IterableDataset, get_worker_info
+from torch_geometric.loader import DataLoader
+
+# training streams start far from the seeds of the fixed train/val/eval datasets (2020, 20000, 40000)
+STREAM_SEED_OFFSET = 10**6
+
+
+def generate_instances(generate_fn, args, ids, **kwargs):
+    """
+    Generates instances ids of a dataset in memory, instance i from seed + i. args are the arguments of
+    generate_fn up to the dataset folder. The progress output of the generators is dropped, it would
+    interleave with the training logs.
+    """
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull), redirect_stderr(
+        devnull
+    ):
+        D, _, _ = generate_fn(*args, None, len(ids), False, ids=ids, **kwargs)
+    return D
+
+
+class StreamDataset(IterableDataset):
+    """
+    Endless stream of freshly generated training instances of the configured graph family. Every pass over
+    the dataset (one epoch) yields size new instances; instance k of the stream is generated from seed + k as
+    in generate_data.py, so a stream is reproducible.
+    Each DataLoader worker generates whole batches (round robin over the batches of the epoch) with
+    generate_fn, e.g. generate_edge_obm_data_geometric.
+    """
+
+    def __init__(self, generate_fn, size, seed, opts, **kwargs):
+        assert (
+            size % opts.batch_size == 0
+        ), "Epoch size must be integer multiple of batch size!"
+        self.generate_fn = generate_fn
+        self.size = size
+        self.batch_size = opts.batch_size
+        self.args = (
+            opts.u_size,
+            opts.v_size,
+            opts.weight_distribution,
+            opts.weight_distribution_param,
+            opts.graph_family_parameter,
+            seed,
+            opts.graph_family,
+        )
+        self.kwargs = kwargs
+        self.epoch = 0
+        self.dataloader = None
+
+    def __getstate__(self):
+        # the workers receive the dataset, not the DataLoader that runs them
+        state = self.__dict__.copy()
+        state["dataloader"] = None
+        return state
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (
+            (0, 1) if worker is None else (worker.id, worker.num_workers)
+        )
+        # the counter of every (persistent) worker advances once per epoch, so the epochs never repeat
+        start = self.epoch * self.size
+        self.epoch += 1
+        for b in range(worker_id, self.size // self.batch_size, num_workers):
+            ids = range(start + b * self.batch_size, start + (b + 1) * self.batch_size)
+            yield from generate_instances(
+                self.generate_fn, self.args, ids, **self.kwargs
+            )
+
+    def get_dataloader(self, opts):
+        """
+        DataLoader over the stream. Its opts.stream_workers processes keep up to opts.stream_prefetch batches
+        each queued ahead of the learner, so generation overlaps with training. The same DataLoader is returned
+        every epoch: its workers are started once and keep their position in the stream.
+        """
+        if self.dataloader is None:
+            self.dataloader = DataLoader(
+                self,
+                batch_size=self.batch_size,
+                num_workers=opts.stream_workers,
+                persistent_workers=opts.stream_workers > 0,
+                prefetch_factor=(
+                    opts.stream_prefetch if opts.stream_workers > 0 else None
+                ),
+            )
+        return self.dataloader
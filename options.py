@@ -50,6 +50,18 @@ def get_options(args=None):
     #        help="Number of instances per epoch during training",
     #    )
 
+    parser.add_argument(
+        "--num_genres",
+        type=int,
+        default=15,
+        help="Number of genres of the movies of osbm instances (15 in MovieLens)",
+    )
+    parser.add_argument(
+        "--num_users",
+        type=int,
+        default=200,
+        help="Number of distinct users of osbm instances, whose ids are their last feature (200 in MovieLens)",
+    )
     parser.add_argument(
         "--capacity_params",
         type=str,
@@ -83,6 +95,62 @@ def get_options(args=None):
         default=1000,
         help="Dataset size for training",
     )
+    parser.add_argument(
+        "--no_mmap",
+        action="store_true",
+        help="Load packed datasets into memory instead of memory-mapping their shards",
+    )
+    parser.add_argument(
+        "--lazy_cache_size",
+        type=int,
+        default=10000,
+        help="Number of instances of a lazy dataset (see generate_data.py --lazy) kept in memory once generated",
+    )
+    parser.add_argument(
+        "--stream_train",
+        action="store_true",
+        help="Train on a stream of freshly generated instances (dataset_size per epoch) instead of train_dataset",
+    )
+    parser.add_argument(
+        "--stream_workers",
+        type=int,
+        default=2,
+        help="Number of processes generating the training stream",
+    )
+    parser.add_argument(
+        "--stream_prefetch",
+        type=int,
+        default=2,
+        help="Number of batches each stream worker generates ahead of training",
+    )
+    parser.add_argument(
+        "--inplace_state",
+        action="store_true",
+        help="Run the validation and evaluation rollouts under torch.inference_mode with states that are "
+        "updated in place (see problem_state/inplace_state.py)",
+    )
+    parser.add_argument(
+        "--arrival_log",
+        type=str,
+        default=None,
+        help="Validate (and evaluate with --eval_only) on the first val_size episodes of this CSV/Parquet "
+        "arrival log instead of val_dataset (see data/arrival_log.py)",
+    )
+    parser.add_argument(
+        "--offline_nodes",
+        type=str,
+        default=None,
+        help="CSV/Parquet file of the u_size offline nodes of --arrival_log (offline_id, and budget for adwords)",
+    )
+    parser.add_argument(
+        "--ragged",
+        action="store_true",
+        help="Train and validate on instances of mixed sizes: train_dataset and val_dataset are comma "
+        "separated lists of datasets with at most u_size fixed nodes, batched by size and padded "
+        "(see data/ragged.py). Not available with the models that encode the whole graph (attention, "
+        "supervised, gnn, gnn-hist and gnn-simp-hist), whose message passing would include the padded "
+        "nodes, nor with greedy-m",
+    )
 
     parser.add_argument(
         "--weight_distribution",
@@ -466,6 +534,31 @@ def get_options(args=None):
     if opts.bl_warmup_epochs is None:
         opts.bl_warmup_epochs = 1 if opts.baseline == "rollout" else 0
     assert (opts.bl_warmup_epochs == 0) or (opts.baseline == "rollout")
+    assert not (
+        opts.stream_train and opts.baseline == "rollout"
+    ), "The rollout baseline evaluates a fixed training dataset, it cannot be used with --stream_train"
+    assert not (opts.ragged and opts.baseline == "rollout"), (
+        "The rollout baseline evaluates the training dataset in fixed size batches, it cannot be used "
+        "with --ragged"
+    )
+    assert not (
+        opts.ragged and (opts.stream_train or opts.arrival_log)
+    ), "--ragged reads train_dataset and val_dataset, not a stream or an arrival log"
+    assert not opts.ragged or opts.model not in (
+        "attention",
+        "supervised",
+        "gnn",
+        "gnn-hist",
+        "gnn-simp-hist",
+        "greedy-m",
+    ), "--ragged pads the graphs, which {} does not support".format(opts.model)
+    assert not (
+        opts.arrival_log and opts.offline_nodes is None
+    ), "--arrival_log needs the --offline_nodes of the log"
+    assert opts.arrival_log is None or opts.problem in (
+        "e-obm",
+        "adwords",
+    ), "Arrival logs are only supported for e-obm and adwords"
     assert (
         opts.dataset_size % opts.batch_size == 0
     ), "Epoch size must be integer multiple of batch size!"
@@ -1,5 +1,6 @@
 import os
 import subprocess
+from data.generate_data import build_datasets, get_options
 
 # Refer to opts.py for details about the flags
 # graph/dataset flags
@@ -156,65 +157,33 @@ def make_dir():
 
 
 def generate_data():
+    # the naming convention here should not be changed!
+    folders = {"train": train_dataset, "val": val_dataset, "eval": eval_dataset}
+    jobs = []
     for n in graph_family_parameters.split(" "):
-        # the naming convention here should not be changed!
-        train_dir = train_dataset + "/parameter_{}".format(n)
-        val_dir = val_dataset + "/parameter_{}".format(n)
-        eval_dir = eval_dataset + "/parameter_{}".format(n)
-
-        generate_train = """python data/generate_data.py --problem {} --dataset_size {} --dataset_folder {} \
-                            --u_size {} --v_size {} --graph_family {} --weight_distribution {} \
-                            --weight_distribution_param {} --graph_family_parameter {} """.format(
-            problem,
-            dataset_size,
-            train_dir,
-            u_size,
-            v_size,
-            graph_family,
-            weight_distribution,
-            weight_distribution_param,
-            n,
-        )
-
-        generate_val = """python data/generate_data.py --problem {} --dataset_size {} --dataset_folder {}  \
-                            --u_size {} --v_size {} --graph_family {} --weight_distribution {} \
-                            --weight_distribution_param {} --graph_family_parameter {} --seed 20000""".format(
-            problem,
-            val_size,
-            val_dir,
-            u_size,
-            v_size,
-            graph_family,
-            weight_distribution,
-            weight_distribution_param,
-            n,
-        )
-
-        generate_eval = """python data/generate_data.py --problem {} --dataset_size {} --dataset_folder {} \
-                            --u_size {} --v_size {} --graph_family {} --weight_distribution {} \
-                            --weight_distribution_param {} --graph_family_parameter {} --seed 40000""".format(
+        jobs += [
+            ("train", n, dataset_size, 2020),
+            ("val", n, val_size, 20000),
+            ("eval", n, eval_size, 40000),
+        ]
+    opts = get_options(
+        [
+            "--problem",
             problem,
-            eval_size,
-            eval_dir,
-            u_size,
-            v_size,
+            "--u_size",
+            str(u_size),
+            "--v_size",
+            str(v_size),
+            "--graph_family",
             graph_family,
+            "--weight_distribution",
             weight_distribution,
-            weight_distribution_param,
-            n,
-        )
-
-        # print(generate_train)
-        # os.system(generate_train)
-        subprocess.run(generate_train, shell=True)
-
-        # print(generate_val)
-        # os.system(generate_val)
-        subprocess.run(generate_val, shell=True)
-
-        # print(generate_eval)
-        # os.system(generate_eval)
-        subprocess.run(generate_eval, shell=True)
+            "--weight_distribution_param",
+        ]
+        + weight_distribution_param.split(" ")
+    )
+    # all the datasets are generated in this process and its pool, the raw data is loaded once per worker
+    build_datasets(jobs, opts, folders, num_workers=os.cpu_count())
 
 
 def train_model():
@@ -183,7 +183,7 @@ class GNN(nn.Module):
             idx = (
                 torch.ones(state.batch_size, 1, 1, device=opts.device)
                 * i
-                / state.v_size
+                / state.v_sizes.unsqueeze(2)
             )
             s = torch.cat(
                 (
@@ -178,7 +178,7 @@ class GNNHist(nn.Module):
             idx = (
                 torch.ones(state.batch_size, 1, 1, device=opts.device)
                 * (i - 1.0)
-                / state.v_size
+                / state.v_sizes.unsqueeze(2)
             )
 
             if i != 1:
@@ -32,16 +32,16 @@ class SimpleGreedy(nn.Module):
         self.problem = problem
         self.rank = 0
 
-    def forward(self, x, opts):
+    def forward(self, x, opts, optimizer=None, baseline=None, return_pi=False):
         state = self.problem.make_state(x, opts.u_size, opts.v_size, opts)
 
         self.rank = self.permute_uniform(
-            torch.arange(1, state.u_size.item() + 2, device=x.device)
+            torch.arange(1, state.u_size + 2, device=opts.device)
             .unsqueeze(0)
-            .expand(state.batch_size.item(), state.u_size.item() + 1)
+            .expand(state.batch_size, state.u_size + 1)
         )
         sequences = []
-        self.rank[:, 0] = state.u_size.item() * 2
+        self.rank[:, 0] = state.u_size * 2
         while not (state.all_finished()):
             mask = state.get_mask().bool()
             r = self.rank.clone()
@@ -52,7 +52,9 @@ class SimpleGreedy(nn.Module):
 
             sequences.append(selected)
 
-        return -state.size, torch.stack(sequences, 1)
+        if return_pi:
+            return -state.size, None, torch.stack(sequences, 1), None
+        return -state.size, torch.stack(sequences, 1), None
 
     def set_decode_type(self, decode_type, temp=None):
         self.decode_type = decode_type
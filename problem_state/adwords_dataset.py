@@ -1,7 +1,17 @@
 from torch_geometric.data import Dataset
 import torch
-from problem_state.adwords_env import StateAdwordsBipartite
+from problem_state.adwords_env import (
+    StateAdwordsBipartite,
+    InplaceStateAdwordsBipartite,
+)
+from problem_state.inplace_state import use_inplace_state
 from data.generate_data import generate_adwords_data_geometric
+from data.arrival_log import ArrivalLogDataset
+from data.compact import decode_instance, is_compact
+from data.data_utils import instance_block
+from data.lazy_dataset import open_dataset
+from data.stream_dataset import StreamDataset
+from data.ragged import padded_v_size
 
 
 class AdwordsBipartite(object):
@@ -13,8 +23,19 @@ class AdwordsBipartite(object):
         return AdwordsBipartiteDataset(*args, **kwargs)
 
     @staticmethod
-    def make_state(*args, **kwargs):
-        return StateAdwordsBipartite.initialize(*args, **kwargs)
+    def make_stream_dataset(*args, **kwargs):
+        return StreamDataset(generate_adwords_data_geometric, *args, **kwargs)
+
+    @staticmethod
+    def make_log_dataset(*args, **kwargs):
+        return ArrivalLogDataset("adwords", *args, **kwargs)
+
+    @staticmethod
+    def make_state(input, u_size, v_size, opts):
+        v_size = padded_v_size(input, v_size)
+        if use_inplace_state(opts):
+            return InplaceStateAdwordsBipartite.initialize(input, u_size, v_size, opts)
+        return StateAdwordsBipartite.initialize(input, u_size, v_size, opts)
 
 
 class AdwordsBipartiteDataset(Dataset):
@@ -27,10 +48,12 @@ class AdwordsBipartiteDataset(Dataset):
         self.problem = problem
         if dataset is not None:
             # self.optimal_size = torch.load("{}/optimal_match.pt".format(dataset))
-            self.data_set = dataset
+            self.data_set = open_dataset(
+                dataset, size, generate_adwords_data_geometric, opts
+            )
         else:
             # If no filename is specified generated data for edge obm probelm
-            D, optimal_size = generate_adwords_data_geometric(
+            D, optimal_size, _ = generate_adwords_data_geometric(
                 opts.u_size,
                 opts.v_size,
                 opts.weight_distribution,
@@ -55,4 +78,9 @@ class AdwordsBipartiteDataset(Dataset):
             data = torch.load(self.data_set + "/data_{}.pt".format(idx))
         else:
             data = self.data_set[idx]
+        if is_compact(data):
+            data = decode_instance(data, dense_adj=True)
+        elif "dense_adj" not in data:
+            # kept by the instances of in-memory datasets, so it is only built once
+            data.dense_adj = instance_block(data)
         return data
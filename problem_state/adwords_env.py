@@ -1,7 +1,9 @@
 import torch
 from typing import NamedTuple
-from torch_geometric.utils import to_dense_adj
 import torch.nn.functional as F
+from problem_state.history import history_tables
+from data.ragged import instance_sizes
+from problem_state.inplace_state import InplaceStateMixin
 
 # from utils.boolmask import mask_long2bool, mask_long_scatter
 
@@ -12,9 +14,11 @@ class StateAdwordsBipartite(NamedTuple):
     u_size: int
     v_size: int
     batch_size: torch.Tensor
-    hist_sum: torch.Tensor
-    hist_sum_sq: torch.Tensor
-    hist_deg: torch.Tensor
+    u_sizes: torch.Tensor  # B by 1 sizes of the instances before padding, see instance_sizes
+    v_sizes: torch.Tensor
+    hist_mean: torch.Tensor  # history feature tables of the batch, see history_tables
+    hist_var: torch.Tensor
+    hist_mean_degree: torch.Tensor
     min_sol: torch.Tensor
     max_sol: torch.Tensor
     sum_sol_sq: torch.Tensor
@@ -39,12 +43,12 @@ class StateAdwordsBipartite(NamedTuple):
         graph_size = u_size + v_size + 1
         batch_size = int(input.batch.size(0) / graph_size)
         # print(batch_size, input.batch.size(0), graph_size)
-        adj = to_dense_adj(
-            input.edge_index,
-            input.batch,
-            input.weight.unsqueeze(1),
-        ).squeeze(-1)
-        adj = adj[:, u_size + 1 :, : u_size + 1]
+        adj, hist_mean, hist_var, hist_mean_degree = history_tables(
+            input, u_size, v_size
+        )
+        u_sizes, v_sizes = instance_sizes(
+            input, batch_size, u_size, v_size, input.batch.device
+        )
         budgets = torch.cat(
             (torch.zeros(batch_size, 1).to(opts.device), input.x.reshape(batch_size, -1)), dim=1
         )
@@ -62,33 +66,14 @@ class StateAdwordsBipartite(NamedTuple):
             u_size=u_size,
             v_size=v_size,
             batch_size=batch_size,
+            u_sizes=u_sizes,
+            v_sizes=v_sizes,
             # Keep visited with depot so we can scatter efficiently (if there is an action for depot)
             orig_budget=budgets,
             curr_budget=budgets.clone(),
-            hist_sum=(
-                torch.zeros(
-                    batch_size,
-                    1,
-                    u_size + 1,
-                    device=input.batch.device,
-                )
-            ),
-            hist_deg=(
-                torch.zeros(
-                    batch_size,
-                    1,
-                    u_size + 1,
-                    device=input.batch.device,
-                )
-            ),
-            hist_sum_sq=(  # Visited as mask is easier to understand, as long more memory efficient
-                torch.zeros(
-                    batch_size,
-                    1,
-                    u_size + 1,
-                    device=input.batch.device,
-                )
-            ),
+            hist_mean=hist_mean,
+            hist_var=hist_var,
+            hist_mean_degree=hist_mean_degree,
             min_sol=torch.zeros(batch_size, 1, device=input.batch.device),
             max_sol=torch.zeros(batch_size, 1, device=input.batch.device),
             sum_sol_sq=torch.zeros(batch_size, 1, device=input.batch.device),
@@ -141,18 +126,11 @@ class StateAdwordsBipartite(NamedTuple):
         total_weights = self.size + selected_weights
         sum_sol_sq = self.sum_sol_sq + selected_weights ** 2
 
-        hist_sum = self.hist_sum + w.unsqueeze(1)
-        hist_sum_sq = self.hist_sum_sq + w.unsqueeze(1) ** 2
-        hist_deg = self.hist_deg + (w.unsqueeze(1) != 0).float()
-        hist_deg[:, :, 0] = float(self.i - self.u_size)
         return self._replace(
             curr_budget=curr_budget,
             size=total_weights,
             i=self.i + 1,
             adj=self.adj[:, 1:, :],
-            hist_sum=hist_sum,
-            hist_sum_sq=hist_sum_sq,
-            hist_deg=hist_deg,
             num_skip=num_skip,
             max_sol=max_sol,
             min_sol=min_sol,
@@ -177,7 +155,7 @@ class StateAdwordsBipartite(NamedTuple):
             deg = (w != 0).float().sum(1)
             deg[deg == 0.0] = 1.0
             mean_w = w.sum(1) / deg
-            mean_budget = self.curr_budget.sum(1) / self.u_size
+            mean_budget = self.curr_budget.sum(1) / self.u_sizes.squeeze(1)
             mean_budget = mean_budget[:, None, None].repeat(1, self.u_size + 1, 1)
             mean_w = mean_w[:, None, None].repeat(1, self.u_size + 1, 1)
             fixed_node_identity = torch.zeros(
@@ -232,7 +210,7 @@ class StateAdwordsBipartite(NamedTuple):
             deg = (w != 0).float().sum(1)
             deg[deg == 0.0] = 1.0
             mean_w = w.sum(1) / deg
-            mean_budget = self.curr_budget.sum(1) / self.u_size
+            mean_budget = self.curr_budget.sum(1) / self.u_sizes.squeeze(1)
             mean_w = mean_w[:, None, None].repeat(1, self.u_size + 1, 1)
             mean_budget = mean_budget[:, None, None].repeat(1, self.u_size + 1, 1)
             s = w.reshape(self.batch_size, self.u_size + 1, 1)
@@ -246,7 +224,7 @@ class StateAdwordsBipartite(NamedTuple):
                 mean_sol,
                 n_skip,
             ) = self.get_hist_features()
-            available_ratio = (deg.unsqueeze(1)) / (self.u_size)
+            available_ratio = (deg.unsqueeze(1)) / self.u_sizes
             fixed_node_identity = torch.zeros(
                 self.batch_size, self.u_size + 1, 1, device=opts.device
             ).float()
@@ -304,15 +282,13 @@ class StateAdwordsBipartite(NamedTuple):
     def get_hist_features(self):
         i = self.i - (self.u_size + 1)
         if i != 0:
-            deg = self.hist_deg.clone()
-            deg[deg == 0] = 1.0
-            h_mean = self.hist_sum / deg
-            h_var = (self.hist_sum_sq - ((self.hist_sum ** 2) / deg)) / deg
-            h_mean_degree = self.hist_deg / i
+            h_mean = self.hist_mean[:, i : i + 1, :]
+            h_var = self.hist_var[:, i : i + 1, :]
+            h_mean_degree = self.hist_mean_degree[:, i : i + 1, :]
             ind = (
                 torch.ones(self.batch_size, 1, device=self.opts.device)
                 * i
-                / self.v_size
+                / self.v_sizes
             )
             curr_sol_size = i - self.num_skip
             var_sol = (
@@ -321,7 +297,7 @@ class StateAdwordsBipartite(NamedTuple):
             mean_sol = self.size / curr_sol_size
             var_sol[curr_sol_size == 0.0] = 0.0
             mean_sol[curr_sol_size == 0.0] = 0.0
-            avg_budget = self.curr_budget.sum(1).unsqueeze(1) / self.u_size
+            avg_budget = self.curr_budget.sum(1).unsqueeze(1) / self.u_sizes
             n_skip = self.num_skip / i
         else:
             (
@@ -334,11 +310,11 @@ class StateAdwordsBipartite(NamedTuple):
                 mean_sol,
                 n_skip,
             ) = (
-                self.hist_sum * 0.0,
-                self.hist_sum * 0.0,
-                self.hist_sum * 0.0,
+                self.hist_mean[:, :1, :],
+                self.hist_var[:, :1, :],
+                self.hist_mean_degree[:, :1, :],
                 self.size * 0.0,
-                self.curr_budget.sum(1).unsqueeze(1) / self.u_size,
+                self.curr_budget.sum(1).unsqueeze(1) / self.u_sizes,
                 self.size * 0.0,
                 self.size * 0.0,
                 self.size * 0.0,
@@ -367,3 +343,26 @@ class StateAdwordsBipartite(NamedTuple):
         return (
             budget_mask + mask > 0.0
         ).long()  # Hacky way to return bool or uint8 depending on pytorch version
+
+
+class InplaceStateAdwordsBipartite(InplaceStateMixin, StateAdwordsBipartite):
+    """
+    StateAdwordsBipartite with its buffers updated in place (see InplaceStateMixin), for inference
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def initialize(input, u_size, v_size, opts):
+        state = StateAdwordsBipartite.initialize(input, u_size, v_size, opts)
+        return InplaceStateAdwordsBipartite._make(state)._compact()
+
+    def update(self, selected):
+        w = self.adj[:, 0, :]
+        selected_weights = w.gather(1, selected)
+        self.curr_budget.scatter_add_(
+            1, selected, -selected_weights.to(self.curr_budget.dtype)
+        )
+        self.curr_budget.masked_fill_(self.curr_budget < 0.0, 0.0)
+        self._update_sol(selected_weights, selected == 0)
+        return self._replace(i=self.i + 1, adj=self.adj[:, 1:, :])
@@ -0,0 +1,52 @@
+import torch
+
+# the bits of every byte value, by (device, dtype)
+_byte_bits = {}
+
+
+def byte_bits(device, dtype):
+    """
+    The 256 by 8 0/1 matrix of the bits of every byte value, lowest bit first
+    """
+    key = (device, dtype)
+    if key not in _byte_bits:
+        values = torch.arange(256, device=device).unsqueeze(1)
+        shifts = torch.arange(8, device=device)
+        _byte_bits[key] = ((values >> shifts) & 1).to(dtype)
+    return _byte_bits[key]
+
+
+def pack_bits(x):
+    """
+    Packs the last dimension of x (nonzero is a set bit) into bytes: [..., n] to uint8 [..., ceil(n / 8)],
+    bit k of byte j being x[..., 8 * j + k].
+    """
+    n = x.shape[-1]
+    num_bytes = (n + 7) // 8
+    bits = torch.zeros(*x.shape[:-1], num_bytes * 8, dtype=torch.uint8, device=x.device)
+    bits[..., :n] = x != 0
+    shifts = torch.arange(8, dtype=torch.uint8, device=x.device)
+    return (bits.view(*x.shape[:-1], num_bytes, 8) << shifts).sum(-1, dtype=torch.uint8)
+
+
+def byte_tables(weights):
+    """
+    The B by ceil(n / 8) by 256 tables of the sums of the B by n weights over the bits set in every byte
+    value, so that the weighted sum of a packed bitset is one lookup per byte (see weighted_count).
+    """
+    batch_size, n = weights.shape
+    num_bytes = (n + 7) // 8
+    padded = weights.new_zeros(batch_size, num_bytes * 8)
+    padded[:, :n] = weights
+    return (
+        padded.view(batch_size, num_bytes, 8)
+        @ byte_bits(weights.device, weights.dtype).T
+    )
+
+
+def weighted_count(bits, tables):
+    """
+    The sums of the weights of the bits set in the B by m by num_bytes packed bitsets, from the byte_tables
+    of the B weight vectors. Returns a B by m tensor.
+    """
+    return tables.gather(2, bits.transpose(1, 2).long()).sum(1)
@@ -1,6 +1,8 @@
 import torch
 from typing import NamedTuple
-from torch_geometric.utils import to_dense_adj
+from problem_state.history import history_tables
+from data.ragged import instance_sizes
+from problem_state.inplace_state import InplaceStateMixin
 
 # from utils.boolmask import mask_long2bool, mask_long_scatter
 
@@ -11,9 +13,11 @@ class StateEdgeBipartite(NamedTuple):
     u_size: int
     v_size: int
     batch_size: torch.Tensor
-    hist_sum: torch.Tensor
-    hist_sum_sq: torch.Tensor
-    hist_deg: torch.Tensor
+    u_sizes: torch.Tensor  # B by 1 sizes of the instances before padding, see instance_sizes
+    v_sizes: torch.Tensor
+    hist_mean: torch.Tensor  # history feature tables of the batch, see history_tables
+    hist_var: torch.Tensor
+    hist_mean_degree: torch.Tensor
     min_sol: torch.Tensor
     max_sol: torch.Tensor
     sum_sol_sq: torch.Tensor
@@ -37,10 +41,12 @@ class StateEdgeBipartite(NamedTuple):
         graph_size = u_size + v_size + 1
         batch_size = int(input.batch.size(0) / graph_size)
         # print(batch_size, input.batch.size(0), graph_size)
-        adj = to_dense_adj(
-            input.edge_index, input.batch, input.weight.unsqueeze(1)
-        ).squeeze(-1)
-        adj = adj[:, u_size + 1 :, : u_size + 1]
+        adj, hist_mean, hist_var, hist_mean_degree = history_tables(
+            input, u_size, v_size
+        )
+        u_sizes, v_sizes = instance_sizes(
+            input, batch_size, u_size, v_size, input.batch.device
+        )
 
         # permute the nodes for data
         idx = torch.arange(adj.shape[1], device=opts.device)
@@ -54,6 +60,8 @@ class StateEdgeBipartite(NamedTuple):
             u_size=u_size,
             v_size=v_size,
             batch_size=batch_size,
+            u_sizes=u_sizes,
+            v_sizes=v_sizes,
             # Keep visited with depot so we can scatter efficiently (if there is an action for depot)
             matched_nodes=(  # Visited as mask is easier to understand, as long more memory efficient
                 torch.zeros(
@@ -62,30 +70,9 @@ class StateEdgeBipartite(NamedTuple):
                     device=input.batch.device,
                 )
             ),
-            hist_sum=(  # Visited as mask is easier to understand, as long more memory efficient
-                torch.zeros(
-                    batch_size,
-                    1,
-                    u_size + 1,
-                    device=input.batch.device,
-                )
-            ),
-            hist_deg=(  # Visited as mask is easier to understand, as long more memory efficient
-                torch.zeros(
-                    batch_size,
-                    1,
-                    u_size + 1,
-                    device=input.batch.device,
-                )
-            ),
-            hist_sum_sq=(  # Visited as mask is easier to understand, as long more memory efficient
-                torch.zeros(
-                    batch_size,
-                    1,
-                    u_size + 1,
-                    device=input.batch.device,
-                )
-            ),
+            hist_mean=hist_mean,
+            hist_var=hist_var,
+            hist_mean_degree=hist_mean_degree,
             min_sol=torch.zeros(batch_size, 1, device=input.batch.device),
             max_sol=torch.zeros(batch_size, 1, device=input.batch.device),
             sum_sol_sq=torch.zeros(batch_size, 1, device=input.batch.device),
@@ -133,18 +120,11 @@ class StateEdgeBipartite(NamedTuple):
         total_weights = self.size + selected_weights
         sum_sol_sq = self.sum_sol_sq + selected_weights ** 2
 
-        hist_sum = self.hist_sum + w.unsqueeze(1)
-        hist_sum_sq = self.hist_sum_sq + w.unsqueeze(1) ** 2
-        hist_deg = self.hist_deg + (w.unsqueeze(1) != 0).float()
-        hist_deg[:, :, 0] = float(self.i - self.u_size)
         return self._replace(
             matched_nodes=nodes,
             size=total_weights,
             i=self.i + 1,
             adj=self.adj[:, 1:, :],
-            hist_sum=hist_sum,
-            hist_sum_sq=hist_sum_sq,
-            hist_deg=hist_deg,
             num_skip=num_skip,
             max_sol=max_sol,
             min_sol=min_sol,
@@ -203,7 +183,7 @@ class StateEdgeBipartite(NamedTuple):
                     h_mean.squeeze(1),
                     h_var.squeeze(1),
                     h_mean_degree.squeeze(1),
-                    self.size / self.u_size,
+                    self.size / self.u_sizes,
                     ind.float(),
                     mean_sol,
                     var_sol,
@@ -231,7 +211,7 @@ class StateEdgeBipartite(NamedTuple):
                 mean_sol,
                 n_skip,
             ) = self.get_hist_features()
-            available_ratio = (deg.unsqueeze(1)) / (self.u_size)
+            available_ratio = (deg.unsqueeze(1)) / self.u_sizes
             fixed_node_identity = torch.zeros(
                 self.batch_size, self.u_size + 1, 1, device=opts.device
             ).float()
@@ -245,7 +225,8 @@ class StateEdgeBipartite(NamedTuple):
                     h_var.transpose(1, 2),
                     h_mean_degree.transpose(1, 2),
                     ind.unsqueeze(2).repeat(1, self.u_size + 1, 1),
-                    self.size.unsqueeze(2).repeat(1, self.u_size + 1, 1) / self.u_size,
+                    self.size.unsqueeze(2).repeat(1, self.u_size + 1, 1)
+                    / self.u_sizes.unsqueeze(2),
                     mean_sol.unsqueeze(2).repeat(1, self.u_size + 1, 1),
                     var_sol.unsqueeze(2).repeat(1, self.u_size + 1, 1),
                     n_skip.unsqueeze(2).repeat(1, self.u_size + 1, 1),
@@ -282,15 +263,13 @@ class StateEdgeBipartite(NamedTuple):
     def get_hist_features(self):
         i = self.i - (self.u_size + 1)
         if i != 0:
-            deg = self.hist_deg.clone()
-            deg[deg == 0] = 1.0
-            h_mean = self.hist_sum / deg
-            h_var = (self.hist_sum_sq - ((self.hist_sum ** 2) / deg)) / deg
-            h_mean_degree = self.hist_deg / i
+            h_mean = self.hist_mean[:, i : i + 1, :]
+            h_var = self.hist_var[:, i : i + 1, :]
+            h_mean_degree = self.hist_mean_degree[:, i : i + 1, :]
             ind = (
                 torch.ones(self.batch_size, 1, device=self.opts.device)
                 * i
-                / self.v_size
+                / self.v_sizes
             )
             curr_sol_size = i - self.num_skip
             var_sol = (
@@ -299,7 +278,7 @@ class StateEdgeBipartite(NamedTuple):
             mean_sol = self.size / curr_sol_size
             var_sol[curr_sol_size == 0.0] = 0.0
             mean_sol[curr_sol_size == 0.0] = 0.0
-            matched_ratio = self.matched_nodes.sum(1).unsqueeze(1) / self.u_size
+            matched_ratio = self.matched_nodes.sum(1).unsqueeze(1) / self.u_sizes
             n_skip = self.num_skip / i
         else:
             (
@@ -312,9 +291,9 @@ class StateEdgeBipartite(NamedTuple):
                 mean_sol,
                 n_skip,
             ) = (
-                self.hist_sum * 0.0,
-                self.hist_sum * 0.0,
-                self.hist_sum * 0.0,
+                self.hist_mean[:, :1, :],
+                self.hist_var[:, :1, :],
+                self.hist_mean_degree[:, :1, :],
                 self.size * 0.0,
                 self.num_skip * 0.0,
                 self.size * 0.0,
@@ -347,3 +326,23 @@ class StateEdgeBipartite(NamedTuple):
         return (
             self.matched_nodes + mask > 0
         ).long()  # Hacky way to return bool or uint8 depending on pytorch version
+
+
+class InplaceStateEdgeBipartite(InplaceStateMixin, StateEdgeBipartite):
+    """
+    StateEdgeBipartite with its buffers updated in place (see InplaceStateMixin), for inference
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def initialize(input, u_size, v_size, opts):
+        state = StateEdgeBipartite.initialize(input, u_size, v_size, opts)
+        return InplaceStateEdgeBipartite._make(state)._compact()
+
+    def update(self, selected):
+        self.matched_nodes.scatter_(-1, selected, True)
+        self.matched_nodes[:, 0] = False
+        w = self.adj[:, 0, :]
+        self._update_sol(w.gather(1, selected), selected == 0)
+        return self._replace(i=self.i + 1, adj=self.adj[:, 1:, :])
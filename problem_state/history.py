@@ -0,0 +1,39 @@
+import torch
+from data.data_utils import dense_bipartite_adj
+
+
+def history_tables(input, u_size, v_size):
+    """
+    The B by |V| by |U| + 1 adjacency block of a batch of e-obm or adwords instances and the tables of its
+    history features: row t of hist_mean, hist_var and hist_mean_degree holds the mean and variance of the
+    weights of the fixed nodes and their degree ratio over the first t arrivals (0 for t = 0), as
+    get_hist_features computed them step by step. They do not depend on the actions, so they are built
+    once per batch and cached on it, for every policy evaluated on the batch.
+    The prefix sums are accumulated arrival by arrival, as the states did, rather than with torch.cumsum,
+    which rounds differently.
+    """
+    key = (u_size, v_size, input.batch.device)
+    cached = getattr(input, "_history_tables", None)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    adj = dense_bipartite_adj(input, u_size, v_size)
+    hist_sum = torch.zeros_like(adj)
+    hist_sum_sq = torch.zeros_like(adj)
+    hist_deg = torch.zeros_like(adj)
+    for t in range(1, v_size):
+        w = adj[:, t - 1, :]
+        hist_sum[:, t, :] = hist_sum[:, t - 1, :] + w
+        hist_sum_sq[:, t, :] = hist_sum_sq[:, t - 1, :] + w**2
+        hist_deg[:, t, :] = hist_deg[:, t - 1, :] + (w != 0).float()
+        hist_deg[:, t, 0] = float(t)
+
+    deg = hist_deg.clone()
+    deg[deg == 0] = 1.0
+    hist_var = (hist_sum_sq - ((hist_sum**2) / deg)) / deg
+    hist_mean = hist_sum / deg
+    steps = torch.arange(v_size, device=adj.device).float()
+    hist_mean_degree = hist_deg / steps[None, :, None]
+    hist_mean_degree[:, 0, :] = 0.0
+    tables = (adj, hist_mean, hist_var, hist_mean_degree)
+    input._history_tables = (key, tables)
+    return tables
@@ -0,0 +1,53 @@
+import torch
+
+
+def use_inplace_state(opts):
+    """
+    Whether make_state returns the in-place variant of the states: with --inplace_state, and only under
+    torch.inference_mode, so that the states of training, whose tensors may be saved by autograd, are
+    never modified.
+    """
+    return opts.inplace_state and torch.is_inference_mode_enabled()
+
+
+class InplaceStateMixin(object):
+    """
+    Shared updates of the in-place states: every buffer of the episode is allocated by initialize and then
+    updated in place, matched_nodes is a bool mask and the degree (of osbm) and skip counters are int32. The
+    features computed from them are the same as the ones of the regular states.
+    """
+
+    __slots__ = ()
+
+    def _compact(self):
+        state = self._replace(num_skip=self.num_skip.int())
+        if "hist_deg" in self._fields:
+            state = state._replace(hist_deg=self.hist_deg.int())
+        if "matched_nodes" in self._fields:
+            state = state._replace(matched_nodes=self.matched_nodes.bool())
+        return state
+
+    def _update_sol(self, selected_weights, skip):
+        """
+        Updates the statistics of the weights of the selected edges, as update of the regular states.
+        """
+        self.num_skip.add_(skip)
+        if self.i == self.u_size + 1:
+            self.min_sol.copy_(selected_weights)
+        else:
+            self.min_sol.masked_fill_(self.min_sol == 0.0, 2.0)
+            selected_weights.masked_fill_(skip, 2.0)
+            torch.minimum(self.min_sol, selected_weights, out=self.min_sol)
+            selected_weights.masked_fill_(selected_weights == 2.0, 0.0)
+            self.min_sol.masked_fill_(self.min_sol == 2.0, 0.0)
+        torch.maximum(self.max_sol, selected_weights, out=self.max_sol)
+        self.size.add_(selected_weights)
+        self.sum_sol_sq.add_(selected_weights**2)
+
+    def _update_hist(self, w, edges):
+        """
+        Adds the weights w and the edges (bool) of the current arrival to the history of the fixed nodes.
+        """
+        self.hist_sum.add_(w.unsqueeze(1))
+        self.hist_sum_sq.add_(w.unsqueeze(1) ** 2)
+        self.hist_deg.add_(edges.unsqueeze(1))
@@ -1,107 +1,75 @@
-from torch.utils.data import Dataset
+from torch_geometric.data import Dataset
 import torch
-import os
-import pickle
-from problem_state.obm_env import StateBipartite
+from problem_state.obm_env import StateBipartite, InplaceStateBipartite
+from problem_state.inplace_state import use_inplace_state
+from data.generate_data import generate_obm_data_geometric
+from data.compact import decode_instance, is_compact
+from data.data_utils import instance_block
+from data.lazy_dataset import open_dataset
+from data.stream_dataset import StreamDataset
+from data.ragged import padded_v_size
 
 
 class Bipartite(object):
 
     NAME = "obm"
 
-    # @staticmethod
-    # def get_costs(dataset, pi):
-    #     # TODO: MODIFY CODE SO IT WORKS WITH BIPARTITE INSTEAD OF TSP
-    #     # Check that tours are valid, i.e. contain 0 to n -1
-    #     assert (
-    #         torch.arange(pi.size(1), out=pi.data.new()).view(1, -1).expand_as(pi)
-    #         == pi.data.sort(1)[0]
-    #     ).all(), "Invalid tour"
-    #    # Gather dataset in order of tour
-    #     d = dataset.gather(1, pi.unsqueeze(-1).expand_as(dataset))
-    #     # Length is distance (L2-norm of difference) from each next location from its prev and of last from first
-    #     return (
-    #         (d[:, 1:] - d[:, :-1]).norm(p=2, dim=2).sum(1)
-    #         + (d[:, 0] - d[:, -1]).norm(p=2, dim=1),
-    #         None,
-    #     )
-
     @staticmethod
     def make_dataset(*args, **kwargs):
         return BipartiteDataset(*args, **kwargs)
 
     @staticmethod
-    def make_state(*args, **kwargs):
-        return StateBipartite.initialize(*args, **kwargs)
-
-    # @staticmethod
-    # def beam_search(
-    #     input,
-    #     beam_size,
-    #     expand_size=None,
-    #     compress_mask=False,
-    #     model=None,
-    #     max_calc_batch_size=4096,
-    # ):
-
-    #     assert model is not None, "Provide model"
-
-    #     fixed = model.precompute_fixed(input)
+    def make_stream_dataset(*args, **kwargs):
+        return StreamDataset(generate_obm_data_geometric, *args, **kwargs)
 
-    #     def propose_expansions(beam):
-    #         return model.propose_expansions(
-    #             beam,
-    #             fixed,
-    #             expand_size,
-    #             normalize=True,
-    #             max_calc_batch_size=max_calc_batch_size,
-    #         )
-
-    #     state = Bipartite.make_state(
-    #         input, visited_dtype=torch.int64 if compress_mask else torch.uint8
-    #     )
-
-    #     return beam_search(state, beam_size, propose_expansions)
+    @staticmethod
+    def make_state(input, u_size, v_size, opts):
+        v_size = padded_v_size(input, v_size)
+        if use_inplace_state(opts):
+            return InplaceStateBipartite.initialize(input, u_size, v_size, opts)
+        return StateBipartite.initialize(input, u_size, v_size, opts)
 
 
 class BipartiteDataset(Dataset):
-    def __init__(self, dataset, size, problem, opts):
-        super(BipartiteDataset, self).__init__()
-
-        self.data_set = dataset
-        self.optimal_size = torch.load("{}/optimal_match.pt".format(self.data_set))
+    def __init__(
+        self, dataset, size, problem, seed, opts, transform=None, pre_transform=None
+    ):
+        super(BipartiteDataset, self).__init__(None, transform, pre_transform)
         self.problem = problem
-        # if opts.train_dataset is not None:
-        #     assert os.path.splitext(opts.train_dataset)[1] == ".pkl"
-
-        #     with open(opts.train_dataset, "rb") as f:
-        #         data = pickle.load(f)
-        #         self.data = data
-        # else:
-        #     ### TODO: Should use generate function in generate_data.py
-        #     # If no filename is specified generated data for normal obm probelm
-        #     self.data = generate_obm_data(opts)
+        if dataset is not None:
+            self.data_set = open_dataset(
+                dataset, size, generate_obm_data_geometric, opts
+            )
+        else:
+            # If no filename is specified generated data for obm problem
+            D, optimal_size, _ = generate_obm_data_geometric(
+                opts.u_size,
+                opts.v_size,
+                opts.weight_distribution,
+                opts.weight_distribution_param,
+                opts.graph_family_parameter,
+                seed,
+                opts.graph_family,
+                None,
+                size,
+                False,
+            )
+            self.optimal_size = optimal_size
+            self.data_set = D
 
         self.size = size
 
-    def __getitem__(self, index):
-
-        # Load data and get label
-        X = torch.load("{}/graphs/{}.pt".format(self.data_set, index))
-        Y = self.optimal_size[index]
-        return X, Y
-
-    def __len__(self):
+    def len(self):
         return self.size
 
-    # def __getitem__(self, idx):
-    #     return tuple(d[idx] for d in self.data)
-
-
-# train_loader = torch.utils.data.DataLoader(
-#              ConcatDataset(
-#                  datasets.ImageFolder(traindir_A),
-#                  datasets.ImageFolder(traindir_B)
-#              ),
-#              batch_size=args.batch_size, shuffle=True,
-#              num_workers=args.workers, pin_memory=True)
+    def get(self, idx):
+        if type(self.data_set) == str:
+            data = torch.load(self.data_set + "/data_{}.pt".format(idx))
+        else:
+            data = self.data_set[idx]
+        if is_compact(data):
+            data = decode_instance(data, dense_adj=True)
+        elif "dense_adj" not in data:
+            # kept by the instances of in-memory datasets, so it is only built once
+            data.dense_adj = instance_block(data)
+        return data
@@ -1,6 +1,10 @@
 import torch
 from typing import NamedTuple
-from torch_geometric.utils import to_dense_adj, sort_edge_index
+from torch_geometric.utils import sort_edge_index
+from data.data_utils import dense_bipartite_adj, sorted_edge_positions
+from data.ragged import instance_sizes
+from problem_state.bitset import byte_tables, pack_bits, weighted_count
+from problem_state.inplace_state import InplaceStateMixin
 
 
 class StateOSBM(NamedTuple):
@@ -11,11 +15,16 @@ class StateOSBM(NamedTuple):
     num_genres: int
     num_users: int
     batch_size: torch.Tensor
+    u_sizes: torch.Tensor  # B by 1 sizes of the instances before padding, see instance_sizes
+    v_sizes: torch.Tensor
     hist_sum: torch.tensor
     hist_sum_sq: torch.tensor
     hist_deg: torch.tensor
     adj: torch.Tensor
-    users: torch.Tensor
+    graph_weights: torch.Tensor  # weights of the sorted graphs.edge_index, kept by add_weights
+    edge_positions: torch.Tensor  # positions of the edges of adj in graph_weights
+    users: torch.Tensor  # genres covered for every user, packed bitsets (see bitset.py)
+    movie_genres: torch.Tensor  # genres of the fixed nodes, packed bitsets
     u_features: torch.Tensor
     v_features: torch.Tensor
     # State
@@ -36,13 +45,15 @@ class StateOSBM(NamedTuple):
         v_size,
         opts,
     ):
-        num_genres = 15
-        num_users = 200
+        num_genres = opts.num_genres
+        num_users = opts.num_users
         graph_size = u_size + v_size + 1
         batch_size = int(input.batch.size(0) / graph_size)
-        adj = to_dense_adj(input.edge_index, input.batch)[
-            :, u_size + 1 :, : u_size + 1
-        ].squeeze(-1)
+        # the block may be the dense_adj of the batch, it is modified below
+        adj = dense_bipartite_adj(input, u_size, v_size, weighted=False).clone()
+        u_sizes, v_sizes = instance_sizes(
+            input, batch_size, u_size, v_size, input.batch.device
+        )
         u_features = input.x.reshape(batch_size, -1)[:, : u_size * num_genres].reshape(
             batch_size, u_size, -1
         )
@@ -66,15 +77,26 @@ class StateOSBM(NamedTuple):
         # adj = adj[:, idx, :].view(adj.size())
         adj[adj == 0.0] = -1.0
         weights = torch.tensor([], device=opts.device)
-        edge_index, _ = sort_edge_index(input.edge_index)
+        edge_index = sort_edge_index(input.edge_index)
+        if isinstance(edge_index, tuple):  # older pytorch geometric, with the edge attributes
+            edge_index = edge_index[0]
         input.edge_index = edge_index
         input.weight = weights
+        edges = adj != -1.0
+        edge_positions = sorted_edge_positions(edges)
+        # one extra entry, written by the missing edges
+        graph_weights = torch.zeros(edge_index.size(1) + 1, device=input.batch.device)
+        graph_weights[edge_positions[:, edges]] = adj[edges]
         return StateOSBM(
             graphs=input,
             adj=adj,
+            graph_weights=graph_weights,
+            edge_positions=edge_positions,
             u_size=u_size,
             v_size=v_size,
             batch_size=batch_size,
+            u_sizes=u_sizes,
+            v_sizes=v_sizes,
             matched_nodes=(
                 torch.zeros(
                     batch_size,
@@ -112,8 +134,13 @@ class StateOSBM(NamedTuple):
             num_skip=torch.zeros(batch_size, 1, device=input.batch.device),
             size=torch.zeros(batch_size, 1, device=input.batch.device),
             users=torch.zeros(
-                batch_size, num_users, num_genres, device=input.batch.device
+                batch_size,
+                num_users,
+                (num_genres + 7) // 8,
+                dtype=torch.uint8,
+                device=input.batch.device,
             ),
+            movie_genres=pack_bits(u_features),
             i=u_size + 1,
             u_features=u_features,
             v_features=v_features,
@@ -143,7 +170,7 @@ class StateOSBM(NamedTuple):
             ).unsqueeze(1)
         ).flatten()
 
-        selected_movie_genre = self.u_features.reshape(
+        selected_movie_genre = self.movie_genres.reshape(
             self.batch_size * (self.u_size + 1), -1
         ).index_select(0, idx)
         users_idx = users_features[:, -1].int() + torch.arange(
@@ -152,7 +179,7 @@ class StateOSBM(NamedTuple):
         users_covered_genre = self.users.reshape(
             self.batch_size * self.num_users, -1
         ).index_select(0, users_idx)
-        s = ((selected_movie_genre + users_covered_genre) > 0).float()
+        s = selected_movie_genre | users_covered_genre
         curr_weights = self.adj[:, v, :].clone()
         selected_weights = curr_weights.gather(1, selected)
         skip = (selected == 0).float()
@@ -209,23 +236,11 @@ class StateOSBM(NamedTuple):
             users_covered_genre = self.users.reshape(
                 self.batch_size * self.num_users, -1
             ).index_select(0, users_idx)
-        covered_genres = (
-            (self.u_features + users_covered_genre.unsqueeze(1)).reshape(
-                self.batch_size, self.u_size + 1, -1
-            )
-            > 0
-        ).float()
-        prev = (
-            (users_features[:, : self.num_genres] * users_covered_genre)
-            .sum(1)
-            .unsqueeze(1)
+        # the gain of a movie: the preference of the user for the genres it newly covers
+        new_genres = self.movie_genres & ~users_covered_genre.unsqueeze(1)
+        curr_weights = weighted_count(
+            new_genres, byte_tables(users_features[:, : self.num_genres])
         )
-        size = (
-            (covered_genres * users_features[:, : self.num_genres].unsqueeze(1))
-            .reshape(self.batch_size, self.u_size + 1, -1)
-            .sum(-1)
-        )
-        curr_weights = size - prev
         self.add_weights(curr_weights, mask)
 
         return curr_weights
@@ -236,19 +251,16 @@ class StateOSBM(NamedTuple):
         w[self.adj[:, v, :] == -1] = -1.0
 
         self.adj[:, v, :] = w
+        # only the edges of the current arrival change, in both directions
+        self.graph_weights.scatter_(
+            0,
+            self.edge_positions[:, :, v, :].flatten().long(),
+            self.adj[:, v, :].expand(2, -1, -1).flatten(),
+        )
         return
 
     def get_graph_weights(self):
-        graph_weights = torch.cat(
-            (
-                self.adj[:, :, :].transpose(1, 2).reshape(self.batch_size, -1),
-                self.adj[:, :, :].reshape(self.batch_size, -1),
-            ),
-            dim=1,
-        ).flatten()
-        graph_weights = graph_weights[graph_weights != -1]
-
-        return graph_weights
+        return self.graph_weights[:-1]
 
     def all_finished(self):
         # Exactly v_size steps
@@ -304,7 +316,7 @@ class StateOSBM(NamedTuple):
                     h_mean.squeeze(1),
                     h_var.squeeze(1),
                     h_mean_degree.squeeze(1),
-                    self.size / self.u_size,
+                    self.size / self.u_sizes,
                     ind.float(),
                     mean_sol,
                     var_sol,
@@ -331,7 +343,7 @@ class StateOSBM(NamedTuple):
                 mean_sol,
                 n_skip,
             ) = self.get_hist_features()
-            available_ratio = deg.unsqueeze(1) / (self.u_size)
+            available_ratio = deg.unsqueeze(1) / self.u_sizes
             fixed_node_identity = torch.zeros(
                 self.batch_size, self.u_size + 1, 1, device=opts.device
             ).float()
@@ -345,7 +357,8 @@ class StateOSBM(NamedTuple):
                     h_var.transpose(1, 2),
                     h_mean_degree.transpose(1, 2),
                     ind.unsqueeze(2).repeat(1, self.u_size + 1, 1),
-                    self.size.unsqueeze(2).repeat(1, self.u_size + 1, 1) / self.u_size,
+                    self.size.unsqueeze(2).repeat(1, self.u_size + 1, 1)
+                    / self.u_sizes.unsqueeze(2),
                     mean_sol.unsqueeze(2).repeat(1, self.u_size + 1, 1),
                     var_sol.unsqueeze(2).repeat(1, self.u_size + 1, 1),
                     n_skip.unsqueeze(2).repeat(1, self.u_size + 1, 1),
@@ -393,7 +406,7 @@ class StateOSBM(NamedTuple):
             ind = (
                 torch.ones(self.batch_size, 1, device=self.opts.device)
                 * i
-                / self.v_size
+                / self.v_sizes
             )
             curr_sol_size = i - self.num_skip
             var_sol = (
@@ -402,7 +415,7 @@ class StateOSBM(NamedTuple):
             mean_sol = self.size / curr_sol_size
             var_sol[curr_sol_size == 0.0] = 0.0
             mean_sol[curr_sol_size == 0.0] = 0.0
-            matched_ratio = self.matched_nodes.sum(1).unsqueeze(1) / self.u_size
+            matched_ratio = self.matched_nodes.sum(1).unsqueeze(1) / self.u_sizes
             n_skip = self.num_skip / i
         else:
             (
@@ -450,3 +463,44 @@ class StateOSBM(NamedTuple):
         return (
             self.matched_nodes.float() + mask > 0
         ).long()  # Hacky way to return bool or uint8 depending on pytorch version
+
+
+class InplaceStateOSBM(InplaceStateMixin, StateOSBM):
+    """
+    StateOSBM with its buffers updated in place (see InplaceStateMixin), for inference
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def initialize(input, u_size, v_size, opts):
+        state = StateOSBM.initialize(input, u_size, v_size, opts)
+        return InplaceStateOSBM._make(state)._compact()
+
+    def update(self, selected):
+        v = self.idx[self.i - (self.u_size + 1)]
+        users_features = self.v_features[:, v, :]
+        idx = (
+            selected
+            + torch.arange(
+                0,
+                self.batch_size * (self.u_size + 1),
+                (self.u_size + 1),
+                device=self.adj.device,
+            ).unsqueeze(1)
+        ).flatten()
+        selected_movie_genre = self.movie_genres.reshape(
+            self.batch_size * (self.u_size + 1), -1
+        ).index_select(0, idx)
+        users_idx = users_features[:, -1].long() + torch.arange(
+            0, self.batch_size * self.num_users, self.num_users, device=self.adj.device
+        )
+        users = self.users.view(self.batch_size * self.num_users, -1)
+        users_covered_genre = users.index_select(0, users_idx)
+        users.index_copy_(0, users_idx, selected_movie_genre | users_covered_genre)
+        curr_weights = self.adj[:, v, :]
+        self._update_sol(curr_weights.gather(1, selected), selected == 0)
+        self.matched_nodes.scatter_(-1, selected, True)
+        edges = curr_weights != -1.0
+        self._update_hist(curr_weights.masked_fill(~edges, 0.0), edges)
+        return self._replace(i=self.i + 1)
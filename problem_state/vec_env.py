@@ -0,0 +1,88 @@
+import torch
+from utils.functions import move_to
+
+
+class VecEnv(object):
+    """
+    Vectorized environment over the episodes of a batch of instances of problem (obm, e-obm, adwords or
+    osbm), for training loops, baselines and benchmarks that drive the episodes from outside the policies.
+    It steps the state of problem.make_state as the decoding loops of the policies do: reset starts an
+    episode on every instance of a batch, step applies one action (a fixed node, 0 to skip) per episode and
+    observe returns the inputs of a model for the current arrivals.
+
+    The episodes of a batch have the same number of arrivals (batches of mixed sizes are padded, see
+    data/ragged.py), so they all finish at the same step. With a source of batches (e.g. a DataLoader),
+    step then resets the env on the next batch, once the costs of the finished episodes are kept in
+    final_cost.
+    """
+
+    def __init__(self, problem, opts, batches=None, model_name=None):
+        self.problem = problem
+        self.opts = opts
+        self.batches = iter(batches) if batches is not None else None
+        self.model_name = model_name
+        self.state = None
+        self.final_cost = None
+
+    def reset(self, batch=None):
+        """
+        Starts an episode on every instance of batch, or of the next batch of the source, and returns the
+        observations of their first arrivals. Returns None once the source is exhausted.
+        """
+        if batch is None:
+            assert self.batches is not None, "reset needs a batch, or the env a source"
+            batch = next(self.batches, None)
+            if batch is None:
+                self.state = None
+                return None
+        self.state = self.problem.make_state(
+            move_to(batch, self.opts.device),
+            self.opts.u_size,
+            self.opts.v_size,
+            self.opts,
+        )
+        return self._arrive()
+
+    @property
+    def batch_size(self):
+        return self.state.batch_size
+
+    @property
+    def num_actions(self):
+        return self.state.u_size + 1
+
+    def step(self, actions):
+        """
+        Matches the current arrival of every episode to actions (B or B by 1 long), and returns the next
+        observations, the B by 1 rewards (the weight of the selected edges) and the B done flags. When the
+        episodes finish, the returned observations are those of the next batch of the source, if any.
+        """
+        assert self.state is not None, "step needs reset first"
+        size = self.state.size.clone()
+        self.state = self.state.update(actions.view(-1, 1))
+        reward = self.state.size - size
+        finished = self.state.all_finished()
+        done = torch.full(
+            (self.batch_size,), finished, dtype=torch.bool, device=reward.device
+        )
+        if not finished:
+            return self._arrive(), reward, done
+        self.final_cost = -self.state.get_final_cost()
+        if self.batches is not None:
+            return self.reset(), reward, done
+        return None, reward, done
+
+    def observe(self, model_name=None):
+        """
+        The inputs of model_name (see get_curr_state of the states) for the current arrivals, or without a
+        model their B by (u_size + 1) edge weights and mask (1 for the nodes that cannot be selected).
+        """
+        if model_name is None:
+            return self.weights, self.mask
+        return self.state.get_curr_state(model_name)
+
+    def _arrive(self):
+        # the weights of osbm depend on the coverage of the user, they are computed before the update
+        self.mask = self.state.get_mask()
+        self.weights = self.state.get_current_weights(self.mask)
+        return self.observe(self.model_name)
@@ -41,6 +41,8 @@ from policy.gnn import GNN
 
 # from nets.pointer_network import PointerNetwork, CriticNetworkLSTM
 from utils.functions import torch_load_cpu, load_problem
+from data.stream_dataset import STREAM_SEED_OFFSET
+from data.ragged import make_ragged_dataset, ragged_dataloader
 
 
 def run(opts):
@@ -110,9 +112,7 @@ def run(opts):
         opts, model_class, problem, load_data, tb_logger
     )
 
-    training_dataset = problem.make_dataset(
-        opts.train_dataset, opts.dataset_size, opts.problem, seed=None, opts=opts
-    )
+    training_dataset = make_training_dataset(problem, opts)
     # training_dataloader = DataLoader(
     #    baseline.wrap_dataset(training_dataset), batch_size=opts.batch_size, num_workers=1, shuffle=True,
     # )
@@ -196,24 +196,15 @@ def run(opts):
                 val_dataloader,
                 baseline,
             ) = setup_training_env(opts, model_class, problem, load_data, tb_logger)
-            training_dataset = problem.make_dataset(
-                opts.train_dataset,
-                opts.dataset_size,
-                opts.problem,
-                seed=None,
-                opts=opts,
-            )
+            training_dataset = make_training_dataset(problem, opts)
 
             # training_dataloader = DataLoader(
             #    baseline.wrap_dataset(training_dataset), batch_size=opts.batch_size, num_workers=1, shuffle=True,
             # )
             best_avg_cr = 0
             for epoch in range(opts.epoch_start, opts.epoch_start + opts.n_epochs):
-                training_dataloader = geoDataloader(
-                    baseline.wrap_dataset(training_dataset),
-                    batch_size=opts.batch_size,
-                    num_workers=0,
-                    shuffle=True,
+                training_dataloader = make_training_dataloader(
+                    training_dataset, baseline, opts
                 )
                 avg_reward, min_cr, avg_cr, loss = train_epoch(
                     model,
@@ -245,11 +236,8 @@ def run(opts):
         for param_ix in range(this_worker, len(PARAM_GRID), N_WORKERS):
             torch.manual_seed(opts.seed)
             params = PARAM_GRID[param_ix]
-            training_dataloader = geoDataloader(
-                baseline.wrap_dataset(training_dataset),
-                batch_size=opts.batch_size,
-                num_workers=0,
-                shuffle=True,
+            training_dataloader = make_training_dataloader(
+                training_dataset, baseline, opts
             )
 
             opts.threshold = params
@@ -270,11 +258,8 @@ def run(opts):
             # with profiler.profile() as prof:
             #    with profiler.record_function("model_inference"):
 
-            training_dataloader = geoDataloader(
-                baseline.wrap_dataset(training_dataset),
-                batch_size=opts.batch_size,
-                num_workers=0,
-                shuffle=True,
+            training_dataloader = make_training_dataloader(
+                training_dataset, baseline, opts
             )
             avg_reward, min_cr, avg_cr, loss = train_epoch(
                 model,
@@ -293,6 +278,63 @@ def run(opts):
             best_avg_cr = max(best_avg_cr, avg_cr)
 
 
+def make_training_dataset(problem, opts):
+    if opts.stream_train:
+        return problem.make_stream_dataset(
+            opts.dataset_size, opts.seed + STREAM_SEED_OFFSET, opts
+        )
+    if opts.ragged:
+        return make_ragged_dataset(
+            problem, opts.train_dataset, opts.dataset_size, opts
+        )
+    return problem.make_dataset(
+        opts.train_dataset, opts.dataset_size, opts.problem, seed=None, opts=opts
+    )
+
+
+def make_training_dataloader(training_dataset, baseline, opts):
+    """
+    Shuffled DataLoader over the (baseline wrapped) training dataset, made every epoch.
+    A training stream is read through the same DataLoader every epoch instead, and mixed size datasets
+    (--ragged) in padded batches of similar sizes.
+    """
+    if opts.stream_train:
+        return training_dataset.get_dataloader(opts)
+    if opts.ragged:
+        return ragged_dataloader(
+            baseline.wrap_dataset(training_dataset), opts, shuffle=True
+        )
+    return geoDataloader(
+        baseline.wrap_dataset(training_dataset),
+        batch_size=opts.batch_size,
+        num_workers=0,
+        shuffle=True,
+    )
+
+
+def make_validation_dataloader(problem, opts):
+    """
+    DataLoader over val_dataset, or over the episodes of --arrival_log. The rollouts need full batches, so
+    the episodes of a log that do not fill one are dropped.
+    """
+    if opts.arrival_log:
+        return geoDataloader(
+            problem.make_log_dataset(
+                opts.arrival_log, opts.offline_nodes, opts.val_size, opts
+            ),
+            batch_size=opts.batch_size,
+            drop_last=True,
+        )
+    if opts.ragged:
+        return ragged_dataloader(
+            make_ragged_dataset(problem, opts.val_dataset, opts.val_size, opts), opts
+        )
+    val_dataset = problem.make_dataset(
+        opts.val_dataset, opts.val_size, opts.problem, seed=None, opts=opts
+    )
+    return geoDataloader(val_dataset, batch_size=opts.batch_size, num_workers=1)
+
+
 def train_wandb(model_class, problem, tb_logger, opts, config=None):
     with wandb.init(config=config):
         torch.manual_seed(opts.seed)
@@ -311,24 +353,15 @@ def train_wandb(model_class, problem, tb_logger, opts, config=None):
             val_dataloader,
             baseline,
         ) = setup_training_env(opts, model_class, problem, load_data, tb_logger)
-        training_dataset = problem.make_dataset(
-            opts.train_dataset,
-            opts.dataset_size,
-            opts.problem,
-            seed=None,
-            opts=opts,
-        )
+        training_dataset = make_training_dataset(problem, opts)
 
         # training_dataloader = DataLoader(
         #    baseline.wrap_dataset(training_dataset), batch_size=opts.batch_size, num_workers=1, shuffle=True,
         # )
         best_avg_cr = 0.0
         for epoch in range(opts.epoch_start, opts.epoch_start + opts.n_epochs):
-            training_dataloader = geoDataloader(
-                baseline.wrap_dataset(training_dataset),
-                batch_size=opts.batch_size,
-                num_workers=0,
-                shuffle=True,
+            training_dataloader = make_training_dataloader(
+                training_dataset, baseline, opts
             )
             avg_reward, min_cr, avg_cr, loss = train_epoch(
                 model,
@@ -463,12 +496,7 @@ def setup_training_env(opts, model_class, problem, load_data, tb_logger):
     #     optimizer1, lambda epoch: opts.lr_decay ** epoch
     # )
     # Start the actual training loop
-    val_dataset = problem.make_dataset(
-        opts.val_dataset, opts.val_size, opts.problem, seed=None, opts=opts
-    )
-    val_dataloader = geoDataloader(
-        val_dataset, batch_size=opts.batch_size, num_workers=1
-    )
+    val_dataloader = make_validation_dataloader(problem, opts)
     if opts.resume:  # TODO: This does not resume both optimizers
         epoch_resume = int(
             os.path.splitext(os.path.split(opts.resume)[-1])[0].split("-")[1]
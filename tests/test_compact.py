@@ -0,0 +1,117 @@
+import pytest
+import torch
+from data.compact import decode_instance, encode_instance, is_compact
+from data.data_utils import from_biadjacency, instance_block
+
+LAYOUTS = ["dense", "csr"]
+
+
+def random_weights(seed, u_size, v_size, p=0.3):
+    g = torch.Generator().manual_seed(seed)
+    return torch.rand(u_size, v_size, generator=g) * (
+        torch.rand(u_size, v_size, generator=g) < p
+    )
+
+
+def random_assignment(seed, u_size, v_size):
+    # the u + 1 of every arrival, 0 if unmatched
+    g = torch.Generator().manual_seed(seed)
+    return torch.randint(0, u_size + 1, (v_size,), generator=g)
+
+
+def e_obm_instance(seed, u_size=10, v_size=30):
+    """
+    An instance laid out as generate_edge_obm_data_geometric: the optimal matching in x, its value in y
+    """
+    data = from_biadjacency(random_weights(seed, u_size, v_size))
+    data.x = random_assignment(seed, u_size, v_size)
+    data.y = torch.tensor(3.5)
+    return data
+
+
+def adwords_instance(seed, u_size=10, v_size=30):
+    """
+    An instance laid out as the adwords generator: the budgets in x, the optimal value then the
+    assignment in y
+    """
+    data = from_biadjacency(random_weights(seed, u_size, v_size))
+    data.x = torch.rand(u_size, dtype=torch.float64)
+    data.y = torch.cat(
+        (torch.tensor([4.25]), random_assignment(seed, u_size, v_size).float())
+    )
+    return data
+
+
+def osbm_instance(seed, u_size=10, v_size=30, num_genres=15):
+    """
+    An instance laid out as the osbm generator: an unweighted graph, the genres of the movies then the
+    features of the users in x, the optimal value then the assignment in y
+    """
+    data = from_biadjacency(random_weights(seed, u_size, v_size) != 0, weighted=False)
+    data.x = torch.cat(
+        (torch.rand(u_size * num_genres), torch.rand(v_size * (num_genres + 4)))
+    )
+    data.y = torch.cat(
+        (torch.tensor([7.0]), random_assignment(seed, u_size, v_size).float())
+    )
+    return data
+
+
+def check_round_trip(data, decoded):
+    assert set(decoded.keys()) == set(data.keys())
+    assert decoded.num_nodes == data.num_nodes
+    for key in ("edge_index", "bipartite", "weight", "x", "y"):
+        if key in data:
+            assert decoded[key].dtype == data[key].dtype, key
+            assert torch.equal(decoded[key], data[key]), key
+
+
+@pytest.mark.parametrize("make", [e_obm_instance, adwords_instance, osbm_instance])
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("seed", range(3))
+def test_round_trip(seed, layout, make):
+    data = make(seed)
+    compact = encode_instance(data, layout)
+    assert is_compact(compact)
+    check_round_trip(data, decode_instance(compact))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_solutions_are_int16(layout):
+    compact = encode_instance(e_obm_instance(0), layout)
+    assert compact.x.dtype == torch.int16
+    compact = encode_instance(adwords_instance(0), layout)
+    assert compact.y.shape == (1,) and compact.y_sol.dtype == torch.int16
+    if layout == "csr":
+        assert compact.adj_col.dtype == torch.int16
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_large_u_size(layout):
+    u_size, v_size = 2**15 + 5, 3
+    weights = random_weights(0, u_size, v_size, p=0.01)
+    weights[-1, 0] = 0.5  # an edge to the last fixed node, past int16
+    data = from_biadjacency(weights)
+    data.x = torch.tensor([u_size, 0, u_size - 1])
+    data.y = torch.tensor([1.5, u_size, 0, u_size - 1])
+    compact = encode_instance(data, layout)
+    assert compact.x.dtype == torch.int32 and compact.y_sol.dtype == torch.int32
+    if layout == "csr":
+        assert compact.adj_col.dtype == torch.int32
+        assert compact.adj_col.max() >= 2**15
+    check_round_trip(data, decode_instance(compact))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_dense_adj(layout):
+    for data in (e_obm_instance(1), osbm_instance(1)):
+        decoded = decode_instance(encode_instance(data, layout), dense_adj=True)
+        assert torch.equal(decoded.dense_adj, instance_block(data).float())
+
+
+def test_float16_weights():
+    data = e_obm_instance(2)
+    decoded = decode_instance(encode_instance(data, "csr", "float16"))
+    assert torch.equal(decoded.edge_index, data.edge_index)
+    assert decoded.weight.dtype == data.weight.dtype
+    assert torch.allclose(decoded.weight, data.weight, atol=1e-3)
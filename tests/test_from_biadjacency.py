@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import torch
+from data.data_utils import biadjacency_to_networkx, from_biadjacency, from_networkx
+
+
+def networkx_instance(weights, weighted=True):
+    """
+    The instance of the |U| by |V| weights built through networkx, with the extra node -1 connected to
+    every arrival (with weight 0 in weighted graphs), as generate_data.py did before from_biadjacency
+    """
+    u_size, v_size = weights.shape
+    G = biadjacency_to_networkx(weights, u_size, v_size)
+    if not weighted:
+        for e in G.edges.values():
+            del e["weight"]
+    G.add_node(-1, bipartite=0)
+    dummy_edges = list(zip([-1] * v_size, range(u_size, u_size + v_size)))
+    if weighted:
+        G.add_edges_from(dummy_edges, weight=0)
+    else:
+        G.add_edges_from(dummy_edges)
+    return from_networkx(G)
+
+
+def sort_edges(data, weighted):
+    # from_networkx lists the edges in adjacency order, both are compared sorted
+    perm = torch.argsort(data.edge_index[0] * data.num_nodes + data.edge_index[1])
+    return data.edge_index[:, perm], (data.weight[perm] if weighted else None)
+
+
+def random_weights(seed):
+    rng = np.random.default_rng(seed)
+    u_size, v_size = rng.integers(1, 30, size=2)
+    p = rng.uniform(0.0, 1.0)
+    return (rng.random((u_size, v_size)) < p) * rng.uniform(0.1, 1.0, (u_size, v_size))
+
+
+@pytest.mark.parametrize("weighted", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_networkx(seed, weighted):
+    weights = random_weights(seed)
+    if not weighted:
+        weights = (weights != 0).astype(float)
+    data = from_biadjacency(weights, weighted)
+    expected = networkx_instance(weights, weighted)
+
+    edge_index, weight = sort_edges(data, weighted)
+    expected_edge_index, expected_weight = sort_edges(expected, weighted)
+    assert set(data.keys()) == set(expected.keys())
+    assert data.num_nodes == expected.num_nodes
+    assert torch.equal(edge_index, expected_edge_index)
+    assert torch.equal(edge_index, data.edge_index), "edges are not sorted"
+    assert torch.equal(data.bipartite.sort()[0], expected.bipartite.sort()[0])
+    if weighted:
+        assert weight.dtype == expected_weight.dtype
+        assert torch.equal(weight, expected_weight)
+
+
+@pytest.mark.parametrize("weighted", [True, False])
+def test_dummy_node(weighted):
+    weights = random_weights(0)
+    u_size, v_size = weights.shape
+    data = from_biadjacency(weights, weighted)
+    src, dst = data.edge_index
+    # node 0 is connected to every arrival, in both directions, with weight 0
+    dummy = src == 0
+    assert torch.equal(dst[dummy], torch.arange(u_size + 1, u_size + v_size + 1))
+    assert torch.equal(src[dst == 0], torch.arange(u_size + 1, u_size + v_size + 1))
+    assert data.bipartite[0] == 0
+    if weighted:
+        assert (data.weight[dummy] == 0).all() and (data.weight[dst == 0] == 0).all()
+
+
+def test_no_edges():
+    data = from_biadjacency(np.zeros((4, 3)))
+    expected = networkx_instance(np.zeros((4, 3)))
+    assert data.num_nodes == expected.num_nodes == 8
+    assert torch.equal(sort_edges(data, True)[0], sort_edges(expected, True)[0])
+    assert data.edge_index.size(1) == 2 * 3
@@ -0,0 +1,66 @@
+import pytest
+import torch
+from IPsolvers.matching import batched_matching
+
+METHODS = ["torch", "scipy", "sparse"]
+
+
+def random_batch(seed, batch_size, v_size, u_size, p):
+    """
+    B by |V| by |U| weights with edge probability p, some arrivals and fixed nodes without edges and the
+    last instance without any
+    """
+    g = torch.Generator().manual_seed(seed)
+    weights = torch.rand(batch_size, v_size, u_size, generator=g) * (
+        torch.rand(batch_size, v_size, u_size, generator=g) < p
+    )
+    weights[0, 0, :] = 0  # an arrival without edges
+    weights[0, :, 0] = 0  # a fixed node without edges
+    weights[-1] = 0
+    return weights
+
+
+def check_solution(weights, value, assignment):
+    """
+    The assignments are matchings of the edges of weights, of total weight value
+    """
+    B, v_size, u_size = weights.shape
+    assert assignment.shape == (B, v_size)
+    assert ((assignment >= 0) & (assignment <= u_size)).all()
+    for w, opt, a in zip(weights, value, assignment):
+        matched = a.nonzero()[:, 0]
+        u = a[matched] - 1
+        assert len(set(u.tolist())) == len(u), "a fixed node is matched twice"
+        assert (w[matched, u] != 0).all(), "an arrival is matched without an edge"
+        assert torch.isclose(w[matched, u].double().sum(), opt.double())
+
+
+@pytest.mark.parametrize(
+    "v_size, u_size", [(10, 10), (30, 10), (10, 30), (1, 7), (7, 1)]
+)
+@pytest.mark.parametrize("p", [0.1, 0.5, 1.0])
+@pytest.mark.parametrize("seed", range(3))
+def test_methods_agree(seed, p, v_size, u_size):
+    weights = random_batch(seed, 8, v_size, u_size, p)
+    expected, _ = batched_matching(weights, "scipy")
+    assert expected[-1] == 0
+    for method in METHODS:
+        value, assignment = batched_matching(weights, method)
+        assert torch.allclose(value.double(), expected.double()), method
+        check_solution(weights, value, assignment)
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_all_zero(method):
+    value, assignment = batched_matching(torch.zeros(3, 5, 4), method)
+    assert (value == 0).all()
+    assert (assignment == 0).all()
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_single_instance(method):
+    weights = random_batch(0, 2, 12, 9, 0.3)[1]
+    value, assignment = batched_matching(weights, method)
+    assert value.dim() == 0 and assignment.shape == (12,)
+    check_solution(weights[None], value[None], assignment[None])
+    assert torch.isclose(value, batched_matching(weights, "scipy")[0])
@@ -102,6 +102,13 @@ def eval_model(models, problem, opts):
     return
 
 
+def inference_context(opts):
+    """
+    Context of the evaluation rollouts, see --inplace_state
+    """
+    return torch.inference_mode() if opts.inplace_state else torch.no_grad()
+
+
 def rollout_eval(models, dataset, opts):
     # Put in greedy evaluation mode!
     model = models[0]
@@ -112,12 +119,12 @@ def rollout_eval(models, dataset, opts):
     def eval_model_bat(bat, optimal):
         bat = move_to(bat, opts.device)
         if opts.problem == "osbm" or opts.problem == "adwords":
-            matchings = bat.y.reshape(opts.batch_size, opts.v_size + 1)[:, 1:]
-            opt_size = bat.y.reshape(opts.batch_size, opts.v_size + 1)[:, 0]
+            matchings = bat.y.reshape(opts.batch_size, -1)[:, 1:]
+            opt_size = bat.y.reshape(opts.batch_size, -1)[:, 0]
         else:
-            matchings = bat.x.reshape(opts.batch_size, opts.v_size)
+            matchings = bat.x.reshape(opts.batch_size, -1)
             opt_size = bat.y
-        with torch.no_grad():
+        with inference_context(opts):
             if model.model_name == "supervised" or model.model_name == "ff-supervised":
                 cost, _, a, _ = model(move_to(bat, opts.device), matchings, opts, False)
             else:
@@ -137,7 +144,7 @@ def rollout_eval(models, dataset, opts):
             )
         # print(-cost.data.flatten())
         jaccard = (a == a1).float().sum(1) / (
-            2 * opts.v_size - (a == a1).float().sum(1)
+            2 * a.size(1) - (a == a1).float().sum(1)
         )
         num_agree = ((a == a1).float()).sum(0)
         count = torch.bincount(a[:, :20].flatten(), minlength=opts.u_size + 1)
@@ -222,12 +229,12 @@ def rollout(model, dataset, opts):
         batch_loss = 0
         bat = move_to(bat, opts.device)
         if opts.problem == "osbm" or opts.problem == "adwords":
-            matchings = bat.y.reshape(opts.batch_size, opts.v_size + 1)[:, 1:]
-            opt_size = bat.y.reshape(opts.batch_size, opts.v_size + 1)[:, 0]
+            matchings = bat.y.reshape(opts.batch_size, -1)[:, 1:]
+            opt_size = bat.y.reshape(opts.batch_size, -1)[:, 0]
         else:
-            matchings = bat.x.reshape(opts.batch_size, opts.v_size)
+            matchings = bat.x.reshape(opts.batch_size, -1)
             opt_size = bat.y
-        with torch.no_grad():
+        with inference_context(opts):
             if opts.model == "supervised" or opts.model == "ff-supervised":
                 cost, _, _, batch_loss = model(bat, matchings, opts, False)
             else:
@@ -527,10 +534,10 @@ def train_batch_supervised(
 ):
     # Evaluate model, get costs and log probabilities
     batch = move_to(batch, opts.device)
-    if opts.problem == "e-obm":
-        matchings = batch.x.reshape(opts.batch_size, opts.v_size)
+    if opts.problem in ("e-obm", "obm"):
+        matchings = batch.x.reshape(opts.batch_size, -1)
     else:
-        matchings = batch.y.reshape(opts.batch_size, opts.v_size + 1)[:, 1:]
+        matchings = batch.y.reshape(opts.batch_size, -1)[:, 1:]
     # print("batch.y ", batch.y)
     cost, log_likelihood, e, batch_loss = model(
         batch, matchings, opts, optimizers, training=True